@@ -1,56 +1,2157 @@
 import gdb
 
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import threading
 import traceback
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, count, islice
+from heapq import heappush, heappushpop
+from operator import add
+from time import perf_counter
+
+# list_trigrams.py is installed next to this file, and the search's worker processes import it from there
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import list_trigrams  # noqa: E402
 
 
 def print_line_number():
     print(f"Current line number: {traceback.extract_stack()[-2].lineno}")
 
 
+class BreakpointIndex:
+    """
+    Keeps a line -> breakpoints index per source file (by full path), updated from the
+    gdb.events breakpoint notifications instead of parsing `i b` on every List.
+    """
+
+    # The line a location like `file.c:42`, `42` or `-source file.c -line 42` asks for
+    REQUESTED_LINE_PATTERN = re.compile(r"(?:^|:|-line\s+)(\d+)$")
+
+    class FileEntry:
+        __slots__ = ("states", "at_line", "lines", "breakpoints", "others", "moved", "digits", "dirty")
+
+        def __init__(self):
+            self.states = {}  # breakpoint number -> list of BreakpointState
+            self.at_line = {}  # line number -> every BreakpointState on it, in `i b` order
+            self.lines = array('i')  # sorted line numbers that have a breakpoint
+            self.breakpoints = {}  # line number -> BreakpointState shown in the gutter
+            self.others = {}  # line number -> the remaining breakpoints, as built by separate()
+            self.moved = {}  # line number asked for -> breakpoints gdb placed on another line
+            self.digits = 0
+            self.dirty = True
+
+    def __init__(self):
+        self.files = {}  # path -> FileEntry
+        self.owners = {}  # breakpoint number -> paths it has locations in
+        self.generation = 0
+
+        for breakpoint in gdb.breakpoints() or []:
+            self.add(breakpoint)
+
+        gdb.events.breakpoint_created.connect(self.on_created)
+        gdb.events.breakpoint_modified.connect(self.on_modified)
+        gdb.events.breakpoint_deleted.connect(self.on_deleted)
+
+    def get_locations(self, breakpoint):
+        """
+        Yields every location of a <MULTIPLE> breakpoint as (full path, line number, enabled). Files
+        are told apart by full path, as a header may be reached as foo.h from one compilation unit
+        and as ../inc/foo.h from another.
+        """
+
+        locations = getattr(breakpoint, "locations", None)
+        if locations is not None:
+            for location in locations:
+                if location.source is not None:
+                    filename, line_number = location.source
+                    yield location.fullname or filename, line_number, location.enabled
+            return
+
+        # gdb before 13 has no Breakpoint.locations
+        try:
+            sals = gdb.decode_line(breakpoint.location)[1] or []
+        except Exception:
+            return
+
+        for sal in sals:
+            if sal.symtab is not None:
+                yield sal.symtab.fullname(), sal.line, True
+
+    def add(self, breakpoint, dirty=True):
+        # Only the `keep` breakpoints and dprintfs listed with a file:line in `i b`
+        if not breakpoint.is_valid() or not breakpoint.visible or breakpoint.temporary or not breakpoint.location:
+            return
+
+        if breakpoint.condition is not None:
+            condition = "stop only if " + breakpoint.condition
+        else:
+            condition = ""
+
+        locations = list(self.get_locations(breakpoint))
+
+        # Where a breakpoint with one location was asked for, when gdb moved it to a line with code
+        match = self.REQUESTED_LINE_PATTERN.search(breakpoint.location.strip())
+        requested_line = int(match.group(1)) if match and len(locations) == 1 else None
+
+        paths = []
+        for path, line_number, enabled in locations:
+            entry = self.files.get(path)
+            if entry is None:
+                entry = self.files[path] = self.FileEntry()
+
+            states = entry.states.setdefault(breakpoint.number, [])
+            if any(state.line_number == line_number for state in states):
+                continue
+
+            states.append(EnhancedListCommand.BreakpointState(line_number, breakpoint.number,
+                                                              breakpoint.enabled and enabled,
+                                                              condition != "", condition, breakpoint.hit_count,
+                                                              requested_line))
+            entry.dirty = entry.dirty or dirty
+            paths.append(path)
+
+        if paths:
+            self.owners[breakpoint.number] = paths
+
+    def remove(self, number, dirty=True):
+        for path in self.owners.pop(number, ()):
+            entry = self.files[path]
+            entry.states.pop(number, None)
+            entry.dirty = entry.dirty or dirty
+
+    def on_created(self, breakpoint):
+        self.add(breakpoint)
+        self.generation += 1
+
+    def on_modified(self, breakpoint):
+        # Fired at every hit: only the lines the breakpoint was and is on are redone
+        number = breakpoint.number
+        before = {path: self.files[path].states.get(number, []) for path in self.owners.get(number, ())}
+        self.remove(number, dirty=False)
+        self.add(breakpoint, dirty=False)
+        after = {path: self.files[path].states.get(number, []) for path in self.owners.get(number, ())}
+
+        for path in before.keys() | after.keys():
+            entry = self.files[path]
+            if not entry.dirty:
+                self.update(entry, number, before.get(path, []), after.get(path, []))
+
+        self.generation += 1
+
+    def on_deleted(self, breakpoint):
+        self.remove(breakpoint.number)
+        self.generation += 1
+
+    def separate(self, all_breakpoints, breakpoints):
+
+        breakpoint_dict = {}
+
+        for breakpoint in all_breakpoints:
+            break_info = [breakpoint.sequence_number, breakpoint.active, breakpoint.conditional, breakpoint.condition,
+                          breakpoint.hit_times]
+
+            if breakpoint.line_number not in breakpoint_dict or breakpoint_dict[breakpoint.line_number] is None:
+                breakpoint_dict[breakpoint.line_number] = []
+
+            breakpoint_dict[breakpoint.line_number].append(break_info)
+
+        sorted_breakpoint_dict = {}
+
+        for key, value in breakpoint_dict.items():
+
+            left_value = []
+
+            for row in value:
+                if row[0] != breakpoints[key].sequence_number:
+                    left_value.append(row)
+
+            sorted_breakpoint = sorted(left_value, key=lambda x: (not x[1], x[0]))
+            sorted_breakpoint_dict[key] = sorted_breakpoint
+
+        return sorted_breakpoint_dict
+
+    def choose(self, states):
+        # The breakpoint shown in the gutter of a line, from its breakpoints in `i b` order
+        shown = None
+        for new_breakpoint in states:
+            cond = new_breakpoint.conditional
+            active = new_breakpoint.active
+
+            if shown is not None:
+                replacement = (not cond and active) or (
+                        not cond and not active and shown.conditional and not shown.active) or (
+                                      cond and active and not shown.active)
+
+                if replacement or shown == new_breakpoint:
+                    shown = new_breakpoint
+
+            else:
+                shown = new_breakpoint
+
+        return shown
+
+    def rebuild(self, entry):
+        all_breakpoints = []
+        entry.at_line = {}
+
+        # Same order as `i b` lists them
+        for number in sorted(entry.states):
+            for new_breakpoint in entry.states[number]:
+                all_breakpoints.append(new_breakpoint)
+                entry.at_line.setdefault(new_breakpoint.line_number, []).append(new_breakpoint)
+
+        breakpoints = {line_number: self.choose(states) for line_number, states in entry.at_line.items()}
+
+        entry.breakpoints = breakpoints
+        entry.others = self.separate(all_breakpoints, breakpoints)
+        entry.lines = array('i', sorted(breakpoints))
+        entry.moved = {}
+        for state in all_breakpoints:
+            if state.requested_line is not None and state.requested_line != state.line_number:
+                entry.moved.setdefault(state.requested_line, []).append(state)
+        entry.digits = max((len(str(value.sequence_number)) for value in breakpoints.values()), default=0)
+        entry.dirty = False
+
+    def update(self, entry, number, old_states, new_states):
+        """
+        Redoes what rebuild() would for the lines where breakpoint `number` had old_states and now
+        has new_states, leaving the rest of the file's entry as it is.
+        """
+
+        recount = False
+        for line_number in {state.line_number for state in old_states} | {state.line_number for state in new_states}:
+            states = [state for state in entry.at_line.get(line_number, ()) if state.sequence_number != number]
+            states += [state for state in new_states if state.line_number == line_number]
+            states.sort(key=lambda state: state.sequence_number)
+
+            previous = entry.breakpoints.get(line_number)
+            index = bisect_left(entry.lines, line_number)
+            if states:
+                shown = entry.breakpoints[line_number] = self.choose(states)
+                entry.others[line_number] = self.separate(states, entry.breakpoints)[line_number]
+                entry.at_line[line_number] = states
+                if previous is None:
+                    entry.lines.insert(index, line_number)
+                entry.digits = max(entry.digits, len(str(shown.sequence_number)))
+            else:
+                shown = None
+                del entry.breakpoints[line_number], entry.others[line_number], entry.at_line[line_number]
+                entry.lines.pop(index)
+
+            # The widest number may have left the gutter
+            if previous is not None and len(str(previous.sequence_number)) == entry.digits and (
+                    shown is None or len(str(shown.sequence_number)) < entry.digits):
+                recount = True
+
+        if recount:
+            entry.digits = max((len(str(value.sequence_number)) for value in entry.breakpoints.values()), default=0)
+
+        for requested_line in {state.requested_line for state in old_states + new_states} - {None}:
+            states = [state for state in entry.moved.get(requested_line, ()) if state.sequence_number != number]
+            states += [state for state in new_states
+                       if state.requested_line == requested_line and state.line_number != requested_line]
+            states.sort(key=lambda state: state.sequence_number)
+
+            if states:
+                entry.moved[requested_line] = states
+            else:
+                entry.moved.pop(requested_line, None)
+
+    def get_entry(self, path):
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+
+        if entry.dirty:
+            self.rebuild(entry)
+
+        return entry
+
+    def query(self, path, start_line=None, end_line=None):
+        entry = self.get_entry(path)
+        if entry is None:
+            return {}, {}
+
+        if start_line is None and end_line is None:
+            return entry.breakpoints, entry.others
+
+        low = 0 if start_line is None else bisect_left(entry.lines, start_line)
+        high = len(entry.lines) if end_line is None else bisect_right(entry.lines, end_line)
+
+        breakpoints = {}
+        breakpoint_dict = {}
+        for line_number in entry.lines[low:high]:
+            breakpoints[line_number] = entry.breakpoints[line_number]
+            breakpoint_dict[line_number] = entry.others[line_number]
+
+        return breakpoints, breakpoint_dict
+
+    def query_moved(self, path, start_line, end_line):
+        """
+        Returns line number -> the breakpoints asked for at that line and placed elsewhere by gdb.
+        """
+
+        entry = self.get_entry(path)
+        if entry is None or not entry.moved:
+            return {}
+
+        return {line_number: states for line_number, states in entry.moved.items()
+                if start_line <= line_number <= end_line}
+
+    def max_digits(self, path):
+        entry = self.get_entry(path)
+        return entry.digits if entry is not None else 0
+
+
+class SourcePrefetcher:
+    """
+    After a stop, reads and indexes the sources of the innermost frames in a worker thread,
+    so that `up`/`down` followed by List finds them in the SourceCache, with the highlighter's
+    checkpoints already computed. The frames are only walked once gdb is back at the prompt,
+    so a burst of scripted steps costs nothing here. The results are handed back to gdb's
+    thread with gdb.post_event, and a new stop abandons the work of the last one.
+    """
+
+    def __init__(self, source_cache, highlighter=None, frames=8, profiler=None):
+        self.source_cache = source_cache
+        self.highlighter = highlighter
+        self.profiler = profiler  # its sample stops are not worth prefetching for
+        self.frames = frames
+        self.generation = 0
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.stopped = False  # stopped since the last prompt
+
+    def get_paths(self):
+        # The distinct source files of the innermost frames that are not cached yet
+        paths = []
+
+        try:
+            frame = gdb.newest_frame()
+        except gdb.error:
+            return paths
+
+        for _ in range(self.frames):
+            if frame is None:
+                break
+
+            symtab = frame.find_sal().symtab
+            if symtab is not None:
+                path = symtab.fullname()
+                if path not in paths and path not in self.source_cache.files:
+                    paths.append(path)
+
+            frame = frame.older()
+
+        return paths
+
+    def on_stop(self, event):
+        if self.profiler is not None and self.profiler.is_sample_stop(event):
+            return
+        self.generation += 1
+        self.stopped = True
+
+    def on_before_prompt(self, event=None):
+        if not self.stopped:
+            return
+        self.stopped = False
+
+        paths = self.get_paths()
+        if not paths:
+            return
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="List prefetch", daemon=True)
+            self.thread.start()
+
+        self.jobs.put((self.generation, paths))
+
+    def run(self):
+        while True:
+            generation, paths = self.jobs.get()
+
+            for path in paths:
+                if generation != self.generation:
+                    break
+
+                try:
+                    source = self.source_cache.load(path)
+                except OSError:
+                    continue
+
+                # Index in steps, so that a new stop is noticed within a big file
+                while not source.complete and generation == self.generation:
+                    source.index_to(len(source.offsets) + 100000)
+
+                if not source.complete:
+                    break
+
+                states = None
+                if self.highlighter is not None and path.split('.')[-1] in self.highlighter.C_TYPES:
+                    states = bytearray(1)
+                    last = (len(source.offsets) - 1) // self.highlighter.CHECKPOINT
+                    while len(states) <= last and generation == self.generation:
+                        self.highlighter.extend_states(states, source, min(len(states) + 256, last))
+
+                gdb.post_event(lambda source=source, states=states: self.finish(source, states))
+
+    def finish(self, source, states):
+        # Runs in gdb's thread
+        source = self.source_cache.put(source)
+        self.source_cache.save(source)
+        if states is not None:
+            self.highlighter.install_states(source, states)
+            self.highlighter.save(source)
+
+
+class RegisterSnapshot:
+    """
+    The x86 flags and count registers of one frame, as read by frame.read_register.
+    """
+
+    __slots__ = ("CF", "PF", "ZF", "SF", "OF", "RCX", "ECX", "CX", "count")
+
+    def __init__(self, frame):
+        eflags = int(frame.read_register("eflags"))
+        self.CF = eflags & 1
+        self.PF = (eflags >> 2) & 1
+        self.ZF = (eflags >> 6) & 1
+        self.SF = (eflags >> 7) & 1
+        self.OF = (eflags >> 11) & 1
+
+        architecture = frame.architecture().name()
+        if "64" in architecture:
+            self.RCX = int(frame.read_register("rcx")) & 0xFFFFFFFFFFFFFFFF
+        else:
+            self.RCX = int(frame.read_register("ecx")) & 0xFFFFFFFF
+        self.ECX = self.RCX & 0xFFFFFFFF
+        self.CX = self.RCX & 0xFFFF
+
+        # LOOP counts with the register matching the code size
+        if "64" in architecture:
+            self.count = self.RCX
+        elif architecture == "i8086":
+            self.count = self.CX
+        else:
+            self.count = self.ECX
+
+
+class IndexStore:
+    """
+    Indexes that outlive the gdb session (line offsets, line tables and highlighter checkpoints),
+    one file per entry under a cache directory. An entry is used only while the file it was built
+    from has the same size, mtime and hash of its first and last SAMPLE bytes, and the least
+    recently used entries are removed once the directory grows past max_bytes.
+    """
+
+    MAGIC = b"GDBLIST1"
+    SAMPLE = 1 << 16
+
+    # Magic, size, mtime in ns, content hash and the number of arrays that follow
+    HEADER = struct.Struct("<8sQq16sH")
+    # Typecode and length of each array
+    ARRAY = struct.Struct("<cQ")
+
+    def __init__(self, directory=None, max_bytes=256 << 20):
+        if directory is None:
+            directory = os.environ.get("GDB_LIST_CACHE_DIR")
+        if directory is None:
+            directory = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "gdb-List")
+
+        self.directory = directory  # "" disables the store
+        self.max_bytes = max_bytes
+        self.total = None  # bytes in the directory, counted on the first save
+        self.fingerprints = {}  # (path, size, mtime) -> content hash
+
+    def enabled(self):
+        return bool(self.directory)
+
+    def fingerprint(self, path, size, mtime, data=None):
+        """
+        Returns (size, mtime, hash of the first and last SAMPLE bytes) of path, from data when
+        the file is already read.
+        """
+
+        key = (path, size, mtime)
+        digest = self.fingerprints.get(key)
+
+        if digest is None:
+            if data is None:
+                with open(path, "rb") as file:
+                    head = file.read(self.SAMPLE)
+                    file.seek(max(size - self.SAMPLE, 0))
+                    tail = file.read(self.SAMPLE)
+            else:
+                head = data[:self.SAMPLE]
+                tail = data[max(size - self.SAMPLE, 0):size]
+
+            digest = self.fingerprints[key] = hashlib.blake2b(head + tail, digest_size=16).digest()
+
+        return size, mtime, digest
+
+    def entry_path(self, kind, path, subject):
+        name = hashlib.blake2b(f"{kind}\0{path}\0{subject}".encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{name}.{kind}")
+
+    def load(self, kind, path, fingerprint, subject=""):
+        """
+        Returns the arrays saved for path, or None when there are none for this version of it.
+        """
+
+        if not self.directory:
+            return None
+
+        entry = self.entry_path(kind, path, subject)
+        try:
+            with open(entry, "rb") as file:
+                magic, size, mtime, digest, arrays_count = self.HEADER.unpack(file.read(self.HEADER.size))
+                if magic != self.MAGIC or (size, mtime, digest) != fingerprint:
+                    return None
+
+                arrays = []
+                for _ in range(arrays_count):
+                    typecode, length = self.ARRAY.unpack(file.read(self.ARRAY.size))
+                    values = array(typecode.decode())
+                    values.fromfile(file, length)
+                    arrays.append(values)
+
+            # Recently used entries are evicted last
+            os.utime(entry)
+        except (OSError, EOFError, struct.error, ValueError):
+            return None
+
+        return arrays
+
+    def save(self, kind, path, fingerprint, arrays, subject=""):
+        if not self.directory:
+            return
+
+        entry = self.entry_path(kind, path, subject)
+        temporary = f"{entry}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, "wb") as file:
+                file.write(self.HEADER.pack(self.MAGIC, *fingerprint, len(arrays)))
+                for values in arrays:
+                    file.write(self.ARRAY.pack(values.typecode.encode(), len(values)))
+                    values.tofile(file)
+            written = os.path.getsize(temporary)
+            # An older version of the entry is replaced, and its bytes no longer count
+            try:
+                written -= os.path.getsize(entry)
+            except OSError:
+                pass
+            os.replace(temporary, entry)
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            return
+
+        if self.total is None:
+            self.total = self.get_total()
+        else:
+            self.total += written
+
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def get_entries(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                return [(entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in entries
+                        if entry.is_file()]
+        except OSError:
+            return []
+
+    def get_total(self):
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self):
+        # Down to three quarters of max_bytes, so that a full directory is not scanned on every save
+        entries = sorted(self.get_entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if total <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.unlink(entry)
+                total -= size
+            except OSError:
+                pass
+
+        self.total = total
+
+
+class SourceFile:
+    """
+    The bytes of one source file (memory-mapped when it is large) and a line-offset
+    index that is only built as far as the lines asked for so far.
+    """
+
+    __slots__ = ("path", "size", "mtime", "data", "offsets", "complete")
+
+    CHUNK = 1 << 22
+
+    def __init__(self, path, size, mtime, data):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.data = data
+        self.offsets = array('q', [0])  # offsets[n] is where line n + 1 starts
+        self.complete = size == 0
+
+    def index_to(self, line_number):
+        offsets = self.offsets
+        data = self.data
+
+        while not self.complete and len(offsets) <= line_number:
+            start = offsets[-1]
+            stop = min(start + self.CHUNK, self.size)
+            chunk = data[start:stop]
+
+            if stop < self.size:
+                cut = chunk.rfind(b"\n")
+                if cut == -1:
+                    # A single line longer than CHUNK
+                    cut = data.find(b"\n", stop)
+                    chunk = data[start:cut + 1] if cut != -1 else data[start:]
+                else:
+                    chunk = chunk[:cut + 1]
+
+            pieces = chunk.split(b"\n")
+            # start + len(line 1) + 1, start + len(line 1) + len(line 2) + 2, ...
+            offsets.extend(islice(map(add, accumulate(map(len, pieces[:-1]), initial=start), count()), 1, None))
+
+            if start + len(chunk) >= self.size:
+                if offsets[-1] == self.size:
+                    offsets.pop()
+                self.complete = True
+
+    def get_lines(self, start_line, end_line):
+        """
+        Returns the decoded lines start_line..end_line (1-based, inclusive) without their line endings.
+        """
+
+        self.index_to(end_line)
+
+        offsets = self.offsets
+        if start_line < 1 or start_line > len(offsets):
+            return []
+
+        stop = offsets[end_line] if end_line < len(offsets) else self.size
+        lines = self.data[offsets[start_line - 1]:stop].split(b"\n")
+        if lines and lines[-1] == b"":
+            lines.pop()
+
+        return [line.decode("utf-8", "replace") for line in lines]
+
+    def get_bytes(self, start_line, end_line):
+        """
+        Returns the raw bytes of the lines start_line..end_line, line endings included.
+        """
+
+        self.index_to(end_line)
+
+        offsets = self.offsets
+        if start_line < 1 or start_line > len(offsets):
+            return b""
+
+        stop = offsets[end_line] if end_line < len(offsets) else self.size
+        return self.data[offsets[start_line - 1]:stop]
+
+    def clamp_line(self, line_number):
+        """
+        Returns line_number, or the number of lines in the file if it has fewer.
+        """
+
+        if self.size == 0:
+            return 0
+
+        self.index_to(line_number)
+        return min(line_number, len(self.offsets)) if self.complete else line_number
+
+    def memory(self):
+        return self.size + self.offsets.itemsize * len(self.offsets)
+
+
+class SourceCache:
+    """
+    LRU cache of SourceFile keyed by path, checked against the file's size and mtime
+    on every lookup so that a file changed under the debugger is read again. The line
+    offsets of large files are kept in the IndexStore for the next session.
+    """
+
+    # Lines indexed since the last save before the offsets are saved again
+    SAVE_STEP = 1 << 16
+
+    def __init__(self, max_bytes=256 << 20, mmap_threshold=1 << 20, store=None):
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+        self.store = store
+        self.files = OrderedDict()  # path -> SourceFile
+        self.saved = {}  # (path, mtime) -> the number of offsets in the store and whether they are all
+
+    def load(self, path, stat=None):
+        # Reads path into a new SourceFile without touching the cache, so it can run in a worker thread
+        if stat is None:
+            stat = os.stat(path)
+
+        with open(path, "rb") as source_file:
+            if stat.st_size and stat.st_size >= self.mmap_threshold:
+                data = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = source_file.read()
+
+        source = SourceFile(path, len(data), stat.st_mtime_ns, data)
+
+        # The offsets indexed by an earlier session
+        if self.store is not None and self.store.enabled() and source.size >= self.mmap_threshold:
+            arrays = self.store.load("lines", path, self.store.fingerprint(path, source.size, source.mtime, data))
+            if arrays is not None and len(arrays) == 2 and arrays[0].typecode == 'q' and arrays[0]:
+                source.offsets, source.complete = arrays[0], bool(arrays[1][0])
+                self.saved[(path, source.mtime)] = (len(source.offsets), source.complete)
+
+        return source
+
+    def save(self, source):
+        # Stores the offsets of a large file once they are complete or have grown by SAVE_STEP lines
+        if self.store is None or not self.store.enabled() or source.size < self.mmap_threshold:
+            return
+
+        key = (source.path, source.mtime)
+        saved, saved_complete = self.saved.get(key, (1, False))
+        if saved_complete or (not source.complete and len(source.offsets) - saved < self.SAVE_STEP):
+            return
+
+        fingerprint = self.store.fingerprint(source.path, source.size, source.mtime, source.data)
+        self.store.save("lines", source.path, fingerprint, [source.offsets, array('B', [source.complete])])
+        self.saved[key] = (len(source.offsets), source.complete)
+
+    def get(self, path):
+        stat = os.stat(path)
+        source = self.files.get(path)
+
+        if source is not None and source.size == stat.st_size and source.mtime == stat.st_mtime_ns:
+            self.files.move_to_end(path)
+            return source
+
+        return self.put(self.load(path, stat))
+
+    def put(self, source):
+        # An entry for the same version of the file is kept, it may already be indexed further
+        cached = self.files.get(source.path)
+        if cached is not None and cached.size == source.size and cached.mtime == source.mtime:
+            return cached
+
+        self.files[source.path] = source
+        self.files.move_to_end(source.path)
+        self.evict()
+
+        return source
+
+    def evict(self):
+        total = sum(source.memory() for source in self.files.values())
+
+        # Keep at least the most recently used file, however large it is
+        while total > self.max_bytes and len(self.files) > 1:
+            path, source = self.files.popitem(last=False)
+            total -= source.memory()
+
+    def get_lines(self, path, start_line, end_line):
+        return self.get(path).get_lines(start_line, end_line)
+
+    def clear(self):
+        self.files.clear()
+
+
+
+
+class SourceSearch:
+    """
+    Finds the lines that match a regular expression in every source file of the loaded objfiles,
+    for `List /pattern`. Each file is summarized by a bitmap of the trigrams it contains, built in
+    a process pool and rebuilt only for files whose size or mtime changed, so only the files that
+    can contain the pattern's literal text are scanned. The scan reads the files that are not in
+    the SourceCache without adding them, so a search does not evict the files being debugged.
+    """
+
+    BITS = list_trigrams.BITS
+
+    # Regular expression syntax that stops literal text being taken from the pattern
+    COMPLEX_PATTERN = re.compile(r"[\\|()\[\]{}]")
+    QUANTIFIED_PATTERN = re.compile(r"(.)[*?]")
+
+    def __init__(self, store=None, max_results=200, pool_threshold=16):
+        self.store = store
+        self.max_results = max_results
+        self.pool_threshold = pool_threshold  # fewer files than this are indexed in gdb's process
+        self.interpreter = None  # the Python the workers run, False when there is none
+        self.pooled = 0  # files indexed by worker processes
+        self.paths = None  # the source files of the loaded objfiles
+        self.bitmaps = {}  # path -> (size, mtime, bitmap)
+
+    def on_objfiles_changed(self, event=None):
+        self.paths = None
+
+    def get_paths(self):
+        # The files `info sources` lists, without the objfile headers and notes
+        if self.paths is None:
+            output = gdb.execute("info sources", to_string=True)
+            paths = {}
+            for line in output.splitlines():
+                line = line.strip()
+                if not line.startswith("/") or line.endswith(":"):
+                    continue
+                for path in line.split(","):
+                    paths[path.strip()] = None
+            self.paths = [path for path in paths if os.path.isfile(path)]
+
+        return self.paths
+
+    def index(self, paths):
+        # Brings the bitmaps of paths up to date; unchanged files are not read at all
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.bitmaps.pop(path, None)
+                continue
+
+            entry = self.bitmaps.get(path)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                continue
+
+            if self.store is not None and self.store.enabled():
+                fingerprint = self.store.fingerprint(path, stat.st_size, stat.st_mtime_ns)
+                arrays = self.store.load("trigrams", path, fingerprint)
+                if arrays is not None and len(arrays) == 1 and len(arrays[0]) == self.BITS // 8:
+                    self.bitmaps[path] = (stat.st_size, stat.st_mtime_ns, arrays[0].tobytes())
+                    continue
+
+            stale.append(path)
+
+        for result in self.map_index(stale):
+            if result is None:
+                continue
+
+            path, size, mtime, bitmap = result
+            self.bitmaps[path] = (size, mtime, bitmap)
+            if self.store is not None and self.store.enabled():
+                self.store.save("trigrams", path, self.store.fingerprint(path, size, mtime), [array('B', bitmap)])
+
+    def get_interpreter(self):
+        """
+        Returns a Python executable of the same version as gdb's, for the worker processes, or None.
+        Inside gdb sys.executable is a path gdb makes up, which may be missing or another Python.
+        """
+
+        if self.interpreter is None:
+            self.interpreter = False
+            version = f"python{sys.version_info.major}.{sys.version_info.minor}"
+            candidates = [sys.executable, getattr(sys, "_base_executable", None),
+                          os.path.join(sys.base_exec_prefix, "bin", version), shutil.which(version)]
+
+            for candidate in candidates:
+                if not candidate or not os.access(candidate, os.X_OK):
+                    continue
+                try:
+                    result = subprocess.run([candidate, "-c", "import sys; print(sys.hexversion)"],
+                                            capture_output=True, text=True, timeout=10)
+                except (OSError, subprocess.SubprocessError):
+                    continue
+                if result.stdout.strip() == str(sys.hexversion):
+                    self.interpreter = candidate
+                    break
+
+        return self.interpreter or None
+
+    def map_index(self, paths):
+        interpreter = self.get_interpreter() if len(paths) >= self.pool_threshold else None
+        if interpreter is not None:
+            # Started afresh, as a fork of gdb would copy locks held by its other threads
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            context.set_executable(interpreter)
+            try:
+                with ProcessPoolExecutor(mp_context=context) as pool:
+                    results = list(pool.map(list_trigrams.index_trigrams, paths, chunksize=8))
+                self.pooled += len(paths)
+                return results
+            except (OSError, RuntimeError, ValueError):
+                pass
+
+        return [list_trigrams.index_trigrams(path) for path in paths]
+
+    def get_literals(self, pattern):
+        """
+        Returns the literal strings a match of pattern must contain, as far as can be told simply.
+        """
+
+        if self.COMPLEX_PATTERN.search(pattern):
+            return []
+
+        # A character followed by * or ? may be missing from a match
+        pattern = self.QUANTIFIED_PATTERN.sub(".", pattern)
+        return [literal for literal in re.split(r"[.^$*+?]", pattern) if len(literal) >= 3]
+
+    def may_contain(self, bitmap, trigrams):
+        for bit in trigrams:
+            if not bitmap[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def search(self, pattern, source_cache):
+        """
+        Yields (path, SourceFile, [line numbers]) for the files with lines matching pattern, in path
+        order, with at most max_results lines in all. The SourceFile is the one scanned, which is
+        not added to source_cache.
+        """
+
+        expression = re.compile(pattern.encode(), re.MULTILINE)
+        paths = self.get_paths()
+        self.index(paths)
+
+        trigrams = set()
+        for literal in self.get_literals(pattern):
+            data = literal.encode()
+            trigrams.update((first * 961 + second * 31 + third) % self.BITS
+                            for first, second, third in zip(data, data[1:], data[2:]))
+
+        results = 0
+        for path in sorted(paths):
+            entry = self.bitmaps.get(path)
+            if entry is None or not self.may_contain(entry[2], trigrams):
+                continue
+
+            # The cached copy when it is current, without making it more recently used
+            source = source_cache.files.get(path)
+            if source is None or (source.size, source.mtime) != entry[:2]:
+                try:
+                    source = source_cache.load(path)
+                except OSError:
+                    continue
+            source.index_to(source.size + 1)
+
+            line_numbers = []
+            position = 0
+            while results < self.max_results:
+                match = expression.search(source.data, position)
+                if match is None:
+                    break
+
+                # One result per line, the search goes on from the next one
+                line_number = bisect_right(source.offsets, match.start())
+                line_numbers.append(line_number)
+                results += 1
+                if line_number >= len(source.offsets):
+                    break
+                position = source.offsets[line_number]
+
+            if line_numbers:
+                yield path, source, line_numbers
+
+            if results >= self.max_results:
+                return
+
+
+class LineTables:
+    """
+    The line table of each symtab, read once into arrays sorted by line: the address ranges of
+    each line and the lines that have code. Windows of lines are found by bisection, and the
+    arrays are also kept in the IndexStore, keyed by the objfile.
+    """
+
+    class Table:
+        __slots__ = ("lines", "starts", "ends", "executable")
+
+        def __init__(self, lines, starts, ends):
+            self.lines = lines  # the line of each address range, sorted
+            self.starts = starts
+            self.ends = ends
+            self.executable = array('i', sorted(set(lines)))
+
+    class Window:
+        __slots__ = ("lines", "executable")
+
+        def __init__(self, lines, end_line):
+            self.lines = lines  # the lines with code in a window, and the first one after it
+            self.executable = set(lines[:-1] if lines and lines[-1] > end_line else lines)
+
+        def __contains__(self, line_number):
+            return line_number in self.executable
+
+        def placement(self, line_number):
+            # The line gdb puts a breakpoint asked for at line_number: the next one with code
+            index = bisect_left(self.lines, line_number)
+            return self.lines[index] if index < len(self.lines) else None
+
+    def __init__(self, store=None):
+        self.store = store
+        self.tables = {}  # (objfile, path) -> Table
+
+    def clear(self, event=None):
+        self.tables.clear()
+
+    def get(self, symtab):
+        key = (symtab.objfile.filename, symtab.fullname())
+        table = self.tables.get(key)
+
+        if table is None:
+            fingerprint = self.get_fingerprint(key[0])
+            arrays = self.store.load("ranges", key[0], fingerprint, key[1]) if fingerprint is not None else None
+
+            if arrays is None or len(arrays) != 3:
+                arrays = self.build(symtab)
+                if fingerprint is not None:
+                    self.store.save("ranges", key[0], fingerprint, arrays, key[1])
+
+            table = self.tables[key] = self.Table(*arrays)
+
+        return table
+
+    def get_fingerprint(self, objfile):
+        # The identity of the objfile on disk, or None when its tables are not stored
+        if self.store is None or not self.store.enabled():
+            return None
+
+        try:
+            stat = os.stat(objfile)
+            return self.store.fingerprint(objfile, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+
+    def build(self, symtab):
+        linetable = symtab.linetable()
+        entries = sorted((entry.pc, entry.line) for entry in linetable) if linetable is not None else []
+        ranges = {}
+
+        # Each entry covers the addresses up to the next one, and line 0 ends a sequence
+        for (pc, line), (next_pc, _) in zip(entries, entries[1:]):
+            if line <= 0 or next_pc <= pc:
+                continue
+            line_ranges = ranges.setdefault(line, [])
+            if line_ranges and line_ranges[-1][1] == pc:
+                line_ranges[-1] = (line_ranges[-1][0], next_pc)
+            else:
+                line_ranges.append((pc, next_pc))
+
+        flat = [(line, start, end) for line in sorted(ranges) for start, end in ranges[line]]
+        return [array('i', (line for line, _, _ in flat)), array('Q', (start for _, start, _ in flat)),
+                array('Q', (end for _, _, end in flat))]
+
+    def get_ranges(self, symtab, line_number):
+        # The (start pc, end pc) ranges of one line
+        table = self.get(symtab)
+        first = bisect_left(table.lines, line_number)
+        last = bisect_right(table.lines, line_number, first)
+        return zip(table.starts[first:last], table.ends[first:last])
+
+    def get_executable(self, symtab, start_line, end_line):
+        """
+        Returns a Window of the lines start_line..end_line that have code, which also tells where a
+        breakpoint on each of the others would be placed, or None when the symtab has no line table.
+        """
+
+        table = self.get(symtab)
+        if not table.executable:
+            return None
+
+        executable = table.executable
+        return self.Window(executable[bisect_left(executable, start_line):bisect_right(executable, end_line) + 1],
+                           end_line)
+
+
+class DisassemblyCache:
+    """
+    The instructions of each function, disassembled once per objfile and address range, for
+    List --asm. The address ranges of each source line come from LineTables.
+    """
+
+    def __init__(self, line_tables, max_functions=64):
+        self.line_tables = line_tables
+        self.max_functions = max_functions
+        self.functions = OrderedDict()  # (objfile, start, end) -> (addresses, [(address, text)])
+        self.blocks = {}  # (objfile, pc) -> (function start, function end)
+
+    def clear(self, event=None):
+        self.functions.clear()
+        self.blocks.clear()
+
+    def on_memory_changed(self, event):
+        # Only the functions whose code was written to are disassembled again
+        start = int(event.address)
+        end = start + int(event.length)
+        for key in [key for key in self.functions if key[1] < end and start < key[2]]:
+            del self.functions[key]
+
+    def get_function_range(self, objfile, start_pc, end_pc):
+        # The function containing start_pc, or just start_pc..end_pc when there is no symbol for it
+        key = (objfile, start_pc)
+        function_range = self.blocks.get(key)
+
+        if function_range is None:
+            try:
+                block = gdb.block_for_pc(start_pc)
+            except RuntimeError:
+                block = None
+
+            while block is not None and block.function is None:
+                block = block.superblock
+
+            function_range = self.blocks[key] = (block.start, block.end) if block is not None else (start_pc, end_pc)
+
+        return function_range
+
+    def get_function(self, architecture, objfile, start, end):
+        key = (objfile, start, end)
+        function = self.functions.get(key)
+
+        if function is None:
+            addresses = array('Q')
+            instructions = []
+            for instruction in architecture.disassemble(start, end - 1):
+                addresses.append(instruction["addr"])
+                instructions.append((instruction["addr"], instruction["asm"]))
+
+            function = self.functions[key] = (addresses, instructions)
+            if len(self.functions) > self.max_functions:
+                self.functions.popitem(last=False)
+        else:
+            self.functions.move_to_end(key)
+
+        return function
+
+    def get_instructions(self, architecture, symtab, start_line, end_line):
+        """
+        Returns line number -> [(address, function start, text)] for the lines start_line..end_line
+        that have code, with the instructions of each range in address order.
+        """
+
+        objfile = symtab.objfile.filename
+        instructions = {}
+
+        for line_number in range(start_line, end_line + 1):
+            for low, high in self.line_tables.get_ranges(symtab, line_number):
+                start, end = self.get_function_range(objfile, low, high)
+                addresses, function = self.get_function(architecture, objfile, start, end)
+                first = bisect_left(addresses, low)
+                last = bisect_left(addresses, high, first)
+                instructions.setdefault(line_number, []).extend(
+                    (address, start, text) for address, text in function[first:last])
+
+        return instructions
+
+
+class ThreadLocations:
+    """
+    The innermost line of every thread, for List --threads. All threads are visited in one pass
+    when a listing first needs them, and the result is kept until the inferior runs again.
+    """
+
+    def __init__(self):
+        self.files = None  # path -> {line number: [thread numbers]}
+
+    def invalidate(self, event=None):
+        self.files = None
+
+    def collect(self):
+        files = {}
+
+        try:
+            inferior = gdb.selected_inferior()
+            selected_thread = gdb.selected_thread()
+        except gdb.error:
+            return files
+
+        if selected_thread is None:
+            return files
+
+        try:
+            selected_frame = gdb.selected_frame()
+        except gdb.error:
+            selected_frame = None
+
+        # Switching threads is what costs, so each one is visited once and the selection put back after
+        try:
+            for thread in inferior.threads():
+                if not thread.is_valid() or not thread.is_stopped():
+                    continue
+
+                thread.switch()
+                try:
+                    sal = gdb.newest_frame().find_sal()
+                except gdb.error:
+                    continue
+
+                if sal.symtab is not None and sal.line > 0:
+                    lines = files.setdefault(sal.symtab.fullname(), {})
+                    lines.setdefault(sal.line, []).append(thread.num)
+        finally:
+            selected_thread.switch()
+            if selected_frame is not None and selected_frame.is_valid():
+                selected_frame.select()
+
+        for lines in files.values():
+            for numbers in lines.values():
+                numbers.sort()
+
+        return files
+
+    def get(self, path):
+        # line number -> the numbers of the threads stopped at that line of path
+        if self.files is None:
+            self.files = self.collect()
+
+        return self.files.get(path, {})
+
+
+class LineProfiler:
+    """
+    Samples where the inferior spends its time, for List --heat. While on, a timer thread asks
+    gdb every `interval` seconds to interrupt the running inferior; at that stop the PC of every
+    thread is mapped to its (file, line) and counted, and the inferior is continued in the
+    background. The waits are stretched so the inferior is stopped at most max_overhead of the time.
+    Run the program in the background (`run &`, `continue &`) to sample it.
+
+    Each sample is a real stop to gdb: it prints the stop (e.g. "Program received signal SIGINT")
+    and runs hook-stop, which Python cannot hold back. The other stop listeners check
+    is_sample_stop() and leave their state alone; use List-auto rather than `List` in hook-stop.
+    """
+
+    def __init__(self, interval=0.01, max_overhead=0.05):
+        self.interval = interval  # seconds between samples
+        self.max_overhead = max_overhead  # the largest fraction of time spent stopped for samples
+        self.enabled = False
+        self.pending = False  # an interrupt was sent and its stop not seen yet
+        self.interrupted = 0.0  # when it was sent
+        self.resuming = False  # stopped for a sample, and about to continue
+        self.thread = None
+        self.wake = threading.Event()
+        self.locations = {}  # pc -> (path, line), or None when the pc has no line
+        self.reset()
+
+        gdb.events.stop.connect(self.on_stop)
+        gdb.events.new_objfile.connect(self.on_new_objfile)
+        gdb.events.clear_objfiles.connect(self.on_new_objfile)
+
+    def reset(self):
+        self.files = {}  # path -> array of sample counts, indexed by line number
+        self.samples = 0  # thread PCs counted
+        self.stops = 0
+        self.sampling_time = 0.0
+        self.started = perf_counter()
+        self.delay = self.interval
+
+    def on_new_objfile(self, event):
+        self.locations.clear()
+
+    def enable(self):
+        if self.enabled:
+            return
+
+        self.enabled = True
+        if not self.stops:
+            self.started = perf_counter()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="List profiler", daemon=True)
+            self.thread.start()
+        else:
+            # The timer waits without a timeout while off
+            self.wake.set()
+
+    def disable(self):
+        self.enabled = False
+        self.wake.set()
+
+    def run(self):
+        # The timer, in its own thread; gdb's state is only touched from gdb's thread
+        while True:
+            if not self.enabled:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+
+            if self.wake.wait(self.delay):
+                # Turned off, or off and on again, since the wait began
+                self.wake.clear()
+                continue
+
+            if self.enabled and not self.pending:
+                gdb.post_event(self.interrupt)
+
+    def interrupt(self):
+        try:
+            thread = gdb.selected_thread()
+            if thread is None or not thread.is_running():
+                return
+            self.pending = True
+            self.interrupted = perf_counter()
+            gdb.execute("interrupt", to_string=True)
+        except gdb.error:
+            self.pending = False
+
+    def get_location(self, pc):
+        if pc not in self.locations:
+            sal = gdb.find_pc_line(pc)
+            self.locations[pc] = (sal.symtab.fullname(), sal.line) if sal.symtab is not None and sal.line > 0 \
+                else None
+
+        return self.locations[pc]
+
+    def count(self, location):
+        path, line = location
+        histogram = self.files.get(path)
+        if histogram is None:
+            histogram = self.files[path] = array('I')
+
+        if len(histogram) <= line:
+            histogram.frombytes(bytes(histogram.itemsize * (line + 1 - len(histogram))))
+        histogram[line] += 1
+
+    def sample(self):
+        # The PC of every stopped thread, with the selected thread and frame put back after
+        selected_thread = gdb.selected_thread()
+        try:
+            selected_frame = gdb.selected_frame()
+        except gdb.error:
+            selected_frame = None
+
+        try:
+            for thread in gdb.selected_inferior().threads():
+                if not thread.is_valid() or not thread.is_stopped():
+                    continue
+
+                thread.switch()
+                try:
+                    location = self.get_location(gdb.newest_frame().pc())
+                except gdb.error:
+                    continue
+
+                if location is not None:
+                    self.count(location)
+                    self.samples += 1
+        finally:
+            if selected_thread is not None and selected_thread.is_valid():
+                selected_thread.switch()
+            if selected_frame is not None and selected_frame.is_valid():
+                selected_frame.select()
+
+    def is_sample_stop(self, event):
+        # True for the stops made for a sample, whether or not on_stop has seen them yet
+        if self.resuming:
+            return True
+
+        # A breakpoint or another signal that came first is left for the user
+        return self.pending and not isinstance(event, gdb.BreakpointEvent) and \
+            getattr(event, "stop_signal", "0") in ("0", "SIGINT")
+
+    def on_stop(self, event):
+        if not self.pending:
+            return
+        sample = self.is_sample_stop(event)
+        self.pending = False
+        if not sample:
+            return
+
+        self.sample()
+        self.stops += 1
+        self.resuming = True
+        gdb.post_event(self.resume)
+
+    def resume(self):
+        self.resuming = False
+        try:
+            gdb.execute("continue &", to_string=True)
+        except gdb.error:
+            return
+
+        # The whole round trip counts, and the wait grows when it is more than max_overhead of the time
+        elapsed = perf_counter() - self.interrupted
+        self.sampling_time += elapsed
+        self.delay = max(self.interval, elapsed / self.max_overhead - elapsed)
+
+    def get_heat(self, path):
+        """
+        Returns (samples per line, samples in all files) for path, or None when it has no samples.
+        """
+
+        histogram = self.files.get(path)
+        if histogram is None or not self.samples:
+            return None
+
+        return histogram, self.samples
+
+    def show(self, lines=20):
+        if not self.samples:
+            gdb.write("No samples recorded.\n")
+            return
+
+        elapsed = perf_counter() - self.started
+        output = [f"{self.samples} samples in {self.stops} stops, every {self.delay * 1000:.1f} ms, "
+                  f"{self.sampling_time * 1000:.1f} ms stopped for sampling"
+                  + (f" ({self.sampling_time * 100 / elapsed:.1f}% of the time)." if elapsed > 0 else "."),
+                  f"{'samples':>8}{'%':>7}  line"]
+
+        hottest = sorted(((count, path, line) for path, histogram in self.files.items()
+                          for line, count in enumerate(histogram) if count), reverse=True)[:lines]
+        for count, path, line in hottest:
+            output.append(f"{count:>8}{count * 100 / self.samples:>6.1f}%  {path}:{line}")
+
+        gdb.write("\n".join(output) + "\n")
+
+
+class ValueAnnotator:
+    """
+    The current values of the expressions on the listed lines, for List --values. The expressions
+    are extracted once per source line, and each value is evaluated once per frame until the
+    inferior runs again.
+    """
+
+    def __init__(self, extract, budget=0.05, max_length=60):
+        self.extract = extract
+        self.budget = budget  # seconds of evaluation per listing
+        self.max_length = max_length
+        self.expressions = {}  # path -> (mtime, {line number: expressions})
+        self.values = {}  # expression -> formatted value, None when it cannot be evaluated
+        self.frame = None
+        self.complete = True  # False when the last annotate() ran out of time
+
+    def invalidate(self, event=None):
+        self.values.clear()
+        self.frame = None
+
+    def get_expressions(self, source, line_number, line):
+        mtime, expressions = self.expressions.get(source.path, (None, None))
+        if mtime != source.mtime:
+            expressions = {}
+            self.expressions[source.path] = (source.mtime, expressions)
+
+        found = expressions.get(line_number)
+        if found is None:
+            found = expressions[line_number] = tuple(self.extract(line))
+
+        return found
+
+    # Increments, decrements, assignments and calls, which would change the program being debugged
+    SIDE_EFFECT_PATTERN = re.compile(r"\+\+|--|\(|(?<![=!<>])=(?!=)")
+
+    def evaluate(self, expression):
+        if self.SIDE_EFFECT_PATTERN.search(expression):
+            raise ValueError(f"Not evaluated, it could change the program: {expression}")
+
+        value = gdb.parse_and_eval(expression)
+        try:
+            # Large arrays and deep structures are cut short
+            text = value.format_string(max_elements=8, max_depth=2)
+        except (AttributeError, TypeError):
+            text = str(value)
+
+        text = " ".join(text.split())
+        return text if len(text) <= self.max_length else text[:self.max_length - 1] + "…"
+
+    def annotate(self, source, lines, start_line, deadline):
+        """
+        Returns line number -> "expression = value, ..." for the lines from start_line,
+        evaluating what is not known yet until deadline (a perf_counter() time).
+        """
+
+        try:
+            frame = gdb.selected_frame()
+        except gdb.error:
+            return {}
+
+        if frame != self.frame:
+            self.values.clear()
+            self.frame = frame
+
+        line_expressions = [self.get_expressions(source, start_line + offset, line)
+                            for offset, line in enumerate(lines)]
+
+        # Every expression in the window is evaluated once, however many lines use it
+        self.complete = True
+        for expression in dict.fromkeys(expression for expressions in line_expressions for expression in expressions):
+            if expression in self.values:
+                continue
+            if perf_counter() > deadline:
+                self.complete = False
+                break
+
+            try:
+                self.values[expression] = self.evaluate(expression)
+            except Exception:
+                self.values[expression] = None
+
+        annotations = {}
+        for offset, expressions in enumerate(line_expressions):
+            shown = [f"{expression} = {self.values[expression]}" for expression in expressions
+                     if self.values.get(expression) is not None]
+            if shown:
+                annotations[start_line + offset] = ", ".join(shown)
+
+        return annotations
+
+
+class SyntaxHighlighter:
+    """
+    Colors C/C++ and assembly sources for List. Only the listed lines are lexed; the one piece
+    of state that crosses lines (inside a /* comment */) is checkpointed every CHECKPOINT lines,
+    so a listing far into a file scans at most CHECKPOINT lines to find where it starts. Up to
+    MAX_EXTEND checkpoints past the last one are computed while listing; further on, the state is
+    guessed from the GUESS_LINES lines before, and the checkpoints are left to the SourcePrefetcher.
+    """
+
+    CHECKPOINT = 256
+    MAX_EXTEND = 32
+    GUESS_LINES = 1024
+
+    C_TYPES = {"c", "h", "cc", "cp", "cpp", "cxx", "c++", "hh", "hpp", "hxx", "h++", "ipp", "inl", "tcc", "C", "H"}
+    ASM_TYPES = {"asm", "s", "S"}
+
+    KEYWORD = "\033[94m"
+    TYPE = "\033[96m"
+    STRING = "\033[93m"
+    NUMBER = "\033[95m"
+    COMMENT = "\033[90m"
+    PREPROCESSOR = "\033[92m"
+    RESET = "\033[0m"
+
+    KEYWORDS = {
+        "auto", "break", "case", "const", "continue", "default", "do", "else", "enum", "extern", "for", "goto",
+        "if", "inline", "register", "restrict", "return", "sizeof", "static", "struct", "switch", "typedef",
+        "union", "volatile", "while", "_Alignas", "_Alignof", "_Atomic", "_Generic", "_Noreturn",
+        "_Static_assert", "_Thread_local", "alignas", "alignof", "and", "asm", "catch", "class", "co_await",
+        "co_return", "co_yield", "concept", "const_cast", "consteval", "constexpr", "constinit", "decltype",
+        "delete", "dynamic_cast", "explicit", "export", "false", "final", "friend", "mutable", "namespace",
+        "new", "noexcept", "not", "nullptr", "operator", "or", "override", "private", "protected", "public",
+        "reinterpret_cast", "requires", "static_assert", "static_cast", "template", "this", "thread_local",
+        "throw", "true", "try", "typeid", "typename", "using", "virtual", "NULL"
+    }
+
+    TYPES = {
+        "void", "char", "short", "int", "long", "float", "double", "signed", "unsigned", "bool", "_Bool",
+        "_Complex", "_Imaginary", "wchar_t", "char8_t", "char16_t", "char32_t", "size_t", "ssize_t",
+        "ptrdiff_t", "intptr_t", "uintptr_t", "int8_t", "int16_t", "int32_t", "int64_t", "uint8_t",
+        "uint16_t", "uint32_t", "uint64_t", "off_t", "FILE"
+    }
+
+    # Code, strings and closed comments: a match stops only at a comment left open, or at the end
+    SCAN_PATTERN = re.compile(rb'''(?:[^/"']+|/(?![*/])|//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)*''',
+                              re.DOTALL)
+
+    C_TOKEN_PATTERN = re.compile(r"""
+        (?P<comment>//.*|/\*.*?(?:\*/|$))
+        | (?P<string>"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?)
+        | (?P<number>\b(?:0[xX][0-9a-fA-F']+|0[bB][01']+|\d[\d']*(?:\.\d*)?(?:[eE][-+]?\d+)?)[uUlLfF]*\b)
+        | (?P<word>[A-Za-z_]\w*)
+    """, re.VERBOSE)
+
+    PREPROCESSOR_PATTERN = re.compile(r"^\s*#\s*\w*")
+    INCLUDE_PATTERN = re.compile(r"^(\s*)(<[^>]*>)")
+
+    ASM_TOKEN_PATTERN = re.compile(r"""
+        (?P<comment>[;#].*|//.*|/\*.*?(?:\*/|$))
+        | (?P<string>"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?)
+        | (?P<label>^\s*[.\w$]+:)
+        | (?P<directive>(?<![\w.])\.\w+|\b(?:section|segment|global|extern|db|dw|dd|dq|resb|resw|resd|resq|equ|times|bits)\b)
+        | (?P<register>%\w+|\b(?:[re]?[abcd]x|[abcd][lh]|[re]?[sd]il?|[re]?[sb]pl?|r(?:[89]|1[0-5])[dwb]?|[re]?ip|[cdefgs]s|[xyz]mm\d+|st\d?)\b)
+        | (?P<number>\$?-?\b(?:0[xX][0-9a-fA-F]+|\d+[hHbB]?)\b)
+    """, re.VERBOSE | re.IGNORECASE)
+
+    # Checkpoints computed since the last save before they are saved again
+    SAVE_STEP = 256
+
+    class FileTokens:
+        __slots__ = ("mtime", "size", "states", "lines", "saved")
+
+        def __init__(self, mtime, size):
+            self.mtime = mtime
+            self.size = size
+            self.states = bytearray(1)  # states[k]: inside a comment at the start of line k * CHECKPOINT + 1
+            self.lines = OrderedDict()  # line number -> (state at start, highlighted text, state at end)
+            self.saved = 1  # checkpoints in the IndexStore
+
+    def __init__(self, max_files=16, max_lines=4096, store=None, min_size=1 << 20):
+        self.max_files = max_files
+        self.max_lines = max_lines  # highlighted lines kept per file
+        self.store = store
+        self.min_size = min_size  # smaller files are not worth storing
+        self.files = OrderedDict()  # path -> FileTokens
+
+    def enabled(self):
+        # gdb's own switch for source highlighting
+        try:
+            return gdb.parameter("style sources") is not False
+        except RuntimeError:
+            return True
+
+    def get_file(self, source):
+        tokens = self.files.get(source.path)
+        if tokens is None or tokens.mtime != source.mtime or tokens.size != source.size:
+            tokens = self.files[source.path] = self.FileTokens(source.mtime, source.size)
+            if len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+
+            # The checkpoints computed by an earlier session
+            if self.store is not None and self.store.enabled() and source.size >= self.min_size:
+                fingerprint = self.store.fingerprint(source.path, source.size, source.mtime, source.data)
+                arrays = self.store.load("tokens", source.path, fingerprint)
+                if arrays is not None and len(arrays) == 1 and arrays[0].typecode == 'B' and arrays[0]:
+                    tokens.states = bytearray(arrays[0])
+                    tokens.saved = len(tokens.states)
+
+        self.files.move_to_end(source.path)
+        return tokens
+
+    def scan(self, data, in_comment):
+        # Whether data, which starts inside a comment or not, ends inside one
+        position = 0
+        if in_comment:
+            position = data.find(b"*/")
+            if position == -1:
+                return True
+            position += 2
+
+        position = self.SCAN_PATTERN.match(data, position).end()
+        return data.startswith(b"/*", position)
+
+    def extend_states(self, states, source, checkpoint):
+        # Appends to states the checkpoints up to checkpoint; uses only its arguments, so it can run in a worker
+        while len(states) <= checkpoint:
+            first = (len(states) - 1) * self.CHECKPOINT + 1
+            data = source.get_bytes(first, first + self.CHECKPOINT - 1)
+            states.append(self.scan(data, states[-1]))
+
+    def install_states(self, source, states):
+        # Checkpoints computed ahead of time, see SourcePrefetcher
+        tokens = self.get_file(source)
+        if len(states) > len(tokens.states):
+            tokens.states = states
+
+    def save(self, source):
+        # Stores the checkpoints of a large file once SAVE_STEP more have been computed, or all of them
+        tokens = self.files.get(source.path)
+        if (tokens is None or tokens.mtime != source.mtime or self.store is None or not self.store.enabled()
+                or source.size < self.min_size):
+            return
+
+        last = (len(source.offsets) - 1) // self.CHECKPOINT + 1 if source.complete else None
+        if len(tokens.states) <= tokens.saved or (len(tokens.states) != last
+                                                  and len(tokens.states) - tokens.saved < self.SAVE_STEP):
+            return
+
+        fingerprint = self.store.fingerprint(source.path, source.size, source.mtime, source.data)
+        self.store.save("tokens", source.path, fingerprint, [array('B', tokens.states)])
+        tokens.saved = len(tokens.states)
+
+    def get_state(self, tokens, source, line_number):
+        # Whether line_number starts inside a comment, and whether that is known rather than guessed
+        checkpoint = (line_number - 1) // self.CHECKPOINT
+
+        if checkpoint < len(tokens.states) + self.MAX_EXTEND:
+            self.extend_states(tokens.states, source, checkpoint)
+            first = checkpoint * self.CHECKPOINT + 1
+            state = tokens.states[checkpoint]
+            known = True
+        else:
+            # Too far to scan from the last checkpoint now: assume no comment is open GUESS_LINES back
+            first = max(line_number - self.GUESS_LINES, 1)
+            state = False
+            known = False
+
+        if line_number > first:
+            state = self.scan(source.get_bytes(first, line_number - 1), state)
+
+        return bool(state), known
+
+    def highlight_c(self, line, in_comment):
+        output = []
+        position = 0
+
+        if in_comment:
+            end = line.find("*/")
+            if end == -1:
+                return f"{self.COMMENT}{line}{self.RESET}", True
+            output.append(f"{self.COMMENT}{line[:end + 2]}{self.RESET}")
+            position = end + 2
+
+        match = self.PREPROCESSOR_PATTERN.match(line) if position == 0 else None
+        if match:
+            output.append(f"{self.PREPROCESSOR}{match.group()}{self.RESET}")
+            position = match.end()
+            if match.group().endswith("include"):
+                include = self.INCLUDE_PATTERN.match(line[position:])
+                if include:
+                    output.append(f"{include.group(1)}{self.STRING}{include.group(2)}{self.RESET}")
+                    position += include.end()
+
+        in_comment = False
+        for match in self.C_TOKEN_PATTERN.finditer(line, position):
+            kind = match.lastgroup
+            text = match.group()
+
+            if kind == "word":
+                color = self.KEYWORD if text in self.KEYWORDS else self.TYPE if text in self.TYPES else None
+            elif kind == "comment":
+                color = self.COMMENT
+                in_comment = text.startswith("/*") and not (len(text) >= 4 and text.endswith("*/"))
+            elif kind == "string":
+                color = self.STRING
+            else:
+                color = self.NUMBER
+
+            if color is not None:
+                output.append(line[position:match.start()])
+                output.append(f"{color}{text}{self.RESET}")
+                position = match.end()
+
+        output.append(line[position:])
+        return "".join(output), in_comment
+
+    def highlight_asm(self, line):
+        colors = {"comment": self.COMMENT, "string": self.STRING, "label": self.PREPROCESSOR,
+                  "directive": self.KEYWORD, "register": self.TYPE, "number": self.NUMBER}
+
+        output = []
+        position = 0
+        for match in self.ASM_TOKEN_PATTERN.finditer(line):
+            output.append(line[position:match.start()])
+            output.append(f"{colors[match.lastgroup]}{match.group()}{self.RESET}")
+            position = match.end()
+
+        output.append(line[position:])
+        return "".join(output)
+
+    def highlight(self, source, file_type, lines, start_line):
+        """
+        Returns the lines from start_line with color codes added, or None for other languages.
+        """
+
+        if file_type in self.ASM_TYPES:
+            return [self.highlight_asm(line.rstrip()) for line in lines]
+
+        if file_type not in self.C_TYPES:
+            return None
+
+        tokens = self.get_file(source)
+        cached = tokens.lines
+        state = None
+        known = True  # guessed lines are not kept
+        highlighted = []
+
+        for offset, line in enumerate(lines):
+            line_number = start_line + offset
+            entry = cached.get(line_number)
+
+            if entry is not None and (state is None or entry[0] == state):
+                cached.move_to_end(line_number)
+            else:
+                if state is None:
+                    state, known = self.get_state(tokens, source, line_number)
+                text, end_state = self.highlight_c(line.rstrip(), state)
+                entry = (state, text, end_state)
+                if known:
+                    cached[line_number] = entry
+                    if len(cached) > self.max_lines:
+                        cached.popitem(last=False)
+
+            highlighted.append(entry[1])
+            state = entry[2]
+
+        return highlighted
+
+
+class ListStats:
+    """
+    Counts and times the phases of every List invocation while enabled. The phases are timed
+    by wrapping the command's methods on the instance, so nothing is wrapped when disabled.
+    Calls made outside an invocation, by List-auto or the TUI window, are not counted.
+    """
+
+    PHASES = ("getscope", "get_breakpoints", "get_flags", "read_source", "read_lines", "highlight", "render")
+
+    def __init__(self, command, slowest_size=10):
+        self.command = command
+        self.enabled = False
+        self.slowest_size = slowest_size
+        self.reset()
+
+    def reset(self):
+        self.invocations = 0
+        self.total_time = 0.0
+        self.counts = dict.fromkeys(self.PHASES, 0)
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.slowest = []  # heap of (time, invocation number, argument, phases)
+        self.current = None
+        self.start = 0.0
+
+    def enable(self):
+        if not self.enabled:
+            for phase in self.PHASES:
+                setattr(self.command, phase, self.timed(phase, getattr(self.command, phase)))
+            self.enabled = True
+
+    def disable(self):
+        if self.enabled:
+            for phase in self.PHASES:
+                delattr(self.command, phase)
+            self.enabled = False
+
+    def timed(self, phase, function):
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if self.current is not None:
+                    elapsed = perf_counter() - start
+                    self.counts[phase] += 1
+                    self.times[phase] += elapsed
+                    calls, total = self.current.get(phase, (0, 0.0))
+                    self.current[phase] = (calls + 1, total + elapsed)
+
+        return timed_function
+
+    def begin(self):
+        self.current = {}
+        self.start = perf_counter()
+
+    def end(self, argument):
+        elapsed = perf_counter() - self.start
+        phases = self.current
+        self.current = None
+
+        self.invocations += 1
+        self.total_time += elapsed
+
+        record = (elapsed, self.invocations, argument, phases)
+        if len(self.slowest) < self.slowest_size:
+            heappush(self.slowest, record)
+        else:
+            heappushpop(self.slowest, record)
+
+        return elapsed, phases
+
+    def format_phases(self, phases):
+        return ", ".join(f"{phase} {calls}x {total * 1000:.3f} ms"
+                         for phase, (calls, total) in phases.items()) or "served from the render cache"
+
+    def show(self):
+        if self.invocations == 0:
+            gdb.write("No List invocations recorded.\n")
+            return
+
+        output = [f"{self.invocations} List invocations, {self.total_time * 1000:.3f} ms in total, "
+                  f"{self.total_time * 1000 / self.invocations:.3f} ms on average.",
+                  f"{'phase':<16}{'calls':>8}{'total ms':>12}{'average ms':>12}"]
+
+        for phase in self.PHASES:
+            calls = self.counts[phase]
+            if calls:
+                output.append(f"{phase:<16}{calls:>8}{self.times[phase] * 1000:>12.3f}"
+                              f"{self.times[phase] * 1000 / calls:>12.3f}")
+
+        output.append("Slowest invocations:")
+        for elapsed, number, argument, phases in sorted(self.slowest, reverse=True):
+            output.append(f"{elapsed * 1000:>10.3f} ms  #{number} List {argument}".rstrip())
+            output.append(f"{'':>14}{self.format_phases(phases)}")
+
+        gdb.write("\n".join(output) + "\n")
+
+
+class ListStatsCommand(gdb.Command):
+    """
+    Shows the time List spends in each phase, with the slowest invocations.
+    Usage: List-stats [on|off|reset]
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        super(ListStatsCommand, self).__init__("List-stats", gdb.COMMAND_STATUS)
+
+    def invoke(self, arg, from_tty):
+        arg = arg.strip()
+
+        if arg == "on":
+            self.stats.enable()
+        elif arg == "off":
+            self.stats.disable()
+        elif arg == "reset":
+            self.stats.reset()
+        elif arg == "":
+            self.stats.show()
+        else:
+            raise gdb.GdbError("Usage: List-stats [on|off|reset]")
+
+
+class ListProfileCommand(gdb.Command):
+    """
+    Samples where the running program spends its time; List --heat shows it next to the source.
+    Usage: List-profile [on|off|reset|interval MS|overhead PERCENT]
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        super(ListProfileCommand, self).__init__("List-profile", gdb.COMMAND_RUNNING)
+
+    def invoke(self, arg, from_tty):
+        words = arg.split()
+
+        try:
+            if words == ["on"]:
+                self.profiler.enable()
+            elif words == ["off"]:
+                self.profiler.disable()
+            elif words == ["reset"]:
+                self.profiler.reset()
+            elif len(words) == 2 and words[0] == "interval" and float(words[1]) > 0:
+                self.profiler.interval = float(words[1]) / 1000
+                self.profiler.delay = self.profiler.interval
+            elif len(words) == 2 and words[0] == "overhead" and 0 < float(words[1]) <= 100:
+                self.profiler.max_overhead = float(words[1]) / 100
+            elif not words:
+                self.profiler.show()
+            else:
+                raise ValueError
+        except ValueError:
+            raise gdb.GdbError("Usage: List-profile [on|off|reset|interval MS|overhead PERCENT]")
+
+
+class AutoLister:
+    """
+    Lists the source after stops without a hook-stop. Stops that come in a burst, as in scripted
+    step/next loops, are coalesced: a listing is written at most once per interval, and otherwise
+    only when gdb is back at the prompt, so the skipped stops cost no source, breakpoint or
+    register work at all. The stops the profiler makes for its samples are never listed.
+    """
+
+    def __init__(self, command, interval=0.25):
+        self.command = command
+        self.interval = interval  # seconds between listings during a burst of stops
+        self.options = set()  # the --options of each listing
+        self.enabled = False
+        self.pending = False  # stopped since the last listing
+        self.last = 0.0  # when the last listing was written
+        self.skipped = 0
+
+    def enable(self, options):
+        if not self.enabled:
+            gdb.events.stop.connect(self.on_stop)
+            gdb.events.before_prompt.connect(self.on_before_prompt)
+        self.enabled = True
+        self.options = options
+
+    def disable(self):
+        if self.enabled:
+            gdb.events.stop.disconnect(self.on_stop)
+            gdb.events.before_prompt.disconnect(self.on_before_prompt)
+        self.enabled = False
+        self.pending = False
+
+    def on_stop(self, event):
+        if self.command.profiler.is_sample_stop(event):
+            return
+
+        if perf_counter() - self.last >= self.interval:
+            self.list()
+        else:
+            self.pending = True
+            self.skipped += 1
+
+    def on_before_prompt(self, event=None):
+        # Stepping has paused: the last stop is shown
+        if self.pending:
+            self.list()
+
+    def list(self):
+        self.pending = False
+        try:
+            self.command.list_lines("", self.options)
+        finally:
+            self.last = perf_counter()
+
+
+class ListAutoCommand(gdb.Command):
+    """
+    Lists the source at every stop, coalescing bursts of stops into at most one listing per interval.
+    Usage: List-auto [on [--option ...]|off|interval MS]
+    """
+
+    def __init__(self, auto_lister):
+        self.auto_lister = auto_lister
+        super(ListAutoCommand, self).__init__("List-auto", gdb.COMMAND_FILES)
+
+    def invoke(self, arg, from_tty):
+        words = arg.split()
+
+        try:
+            if words and words[0] == "on":
+                options, rest = self.auto_lister.command.parse_options(" ".join(words[1:]))
+                if rest or "stats" in options:
+                    raise ValueError
+                self.auto_lister.enable(options)
+            elif words == ["off"]:
+                self.auto_lister.disable()
+            elif len(words) == 2 and words[0] == "interval" and float(words[1]) >= 0:
+                self.auto_lister.interval = float(words[1]) / 1000
+            elif not words:
+                state = "on" if self.auto_lister.enabled else "off"
+                gdb.write(f"List-auto is {state}, at most one listing every {self.auto_lister.interval * 1000:g} ms "
+                          f"during a burst of stops; {self.auto_lister.skipped} stops skipped.\n")
+            else:
+                raise ValueError
+        except ValueError:
+            raise gdb.GdbError("Usage: List-auto [on [--option ...]|off|interval MS]")
+
+
 class EnhancedListCommand(gdb.Command):
     """
     Replaces the original `list` command to show source code with
     highlighted breakpoints (red) and the next line to be executed (green).
     """
 
+    # The --options List accepts before the `list` argument
+    OPTIONS = {"asm", "bt", "heat", "json", "stats", "threads", "values"}
+
+    # The heat bar of List --heat, from a few samples to the hottest line of the file
+    HEAT_BARS = "▁▂▃▄▅▆▇█"
+
+    # Lines shown above and below each frame's line with List --bt
+    BACKTRACE_CONTEXT = 2
+
+    # The thread numbers listed after a line with List --threads
+    THREADS_SHOWN = 8
+
+    # Instruction prefixes gdb prints before the mnemonic
+    INSTRUCTION_PREFIXES = {"bnd", "notrack", "lock", "rep", "repe", "repz", "repne", "repnz", "data16", "addr32",
+                            "cs", "ds", "es", "ss", "fs", "gs"}
+
     def __init__(self):
-        # self.x86_jump_conditions = {}
-        self.ZF = 0
+        # Predicates over a RegisterSnapshot; LOOP* decrement the count register before testing it
         self.x86_jump_conditions = {
             # Unsigned arithmetic
-            "JC": "self.CF == 1",
-            "JNC": "self.CF == 0",
-            "JA": "(self.CF == 0) and (self.ZF == 0)",
-            "JAE": "self.CF == 0",
-            "JB": "self.CF == 1",
-            "JBE": "(self.CF == 1) or (self.ZF == 1)",
-            "JE": "self.ZF == 1",
-            "JZ": "self.ZF == 1",
-            "JNE": "self.ZF == 0",
-            "JNZ": "self.ZF == 0",
-            "JS": "self.SF == 1",
-            "JNS": "self.SF == 0",
-            "JO": "self.OF == 1",
-            "JNO": "self.OF == 0",
-            "JL": "self.SF != self.OF",
-            "JNGE": "self.SF != self.OF",
-            "JGE": "self.SF == self.OF",
-            "JNL": "self.SF == self.OF",
-            "JLE": "(self.ZF == 1) or (self.SF != self.OF)",
-            "JNG": "(self.ZF == 1) or (self.SF != self.OF)",
-            "JG": "(self.ZF == 0) and (self.SF == self.OF)",
-            "JNLE": "(self.ZF == 0) and (self.SF == self.OF)",
-            "JP": "self.PF == 1",
-            "JPE": "self.PF == 1",
-            "JNP": "self.PF == 0",
-            "JPO": "self.PF == 0",
-            "LOOP": "self.ECX != 0",
-            "LOOPZ": "(self.ECX != 0) and (self.ZF == 1)",
-            "LOOPE": "(self.ECX != 0) and (self.ZF == 1)",
-            "LOOPNZ": "(self.ECX != 0) and (self.ZF == 0)",
-            "LOOPNE": "(self.ECX != 0) and (self.ZF == 0)"
+            "JC": lambda r: r.CF == 1,
+            "JNC": lambda r: r.CF == 0,
+            "JA": lambda r: (r.CF == 0) and (r.ZF == 0),
+            "JAE": lambda r: r.CF == 0,
+            "JB": lambda r: r.CF == 1,
+            "JBE": lambda r: (r.CF == 1) or (r.ZF == 1),
+            "JE": lambda r: r.ZF == 1,
+            "JZ": lambda r: r.ZF == 1,
+            "JNE": lambda r: r.ZF == 0,
+            "JNZ": lambda r: r.ZF == 0,
+            "JS": lambda r: r.SF == 1,
+            "JNS": lambda r: r.SF == 0,
+            "JO": lambda r: r.OF == 1,
+            "JNO": lambda r: r.OF == 0,
+            "JL": lambda r: r.SF != r.OF,
+            "JNGE": lambda r: r.SF != r.OF,
+            "JGE": lambda r: r.SF == r.OF,
+            "JNL": lambda r: r.SF == r.OF,
+            "JLE": lambda r: (r.ZF == 1) or (r.SF != r.OF),
+            "JNG": lambda r: (r.ZF == 1) or (r.SF != r.OF),
+            "JG": lambda r: (r.ZF == 0) and (r.SF == r.OF),
+            "JNLE": lambda r: (r.ZF == 0) and (r.SF == r.OF),
+            "JP": lambda r: r.PF == 1,
+            "JPE": lambda r: r.PF == 1,
+            "JNP": lambda r: r.PF == 0,
+            "JPO": lambda r: r.PF == 0,
+            "JCXZ": lambda r: r.CX == 0,
+            "JECXZ": lambda r: r.ECX == 0,
+            "JRCXZ": lambda r: r.RCX == 0,
+            "LOOP": lambda r: r.count != 1,
+            "LOOPZ": lambda r: (r.count != 1) and (r.ZF == 1),
+            "LOOPE": lambda r: (r.count != 1) and (r.ZF == 1),
+            "LOOPNZ": lambda r: (r.count != 1) and (r.ZF == 0),
+            "LOOPNE": lambda r: (r.count != 1) and (r.ZF == 0)
         }
 
+        # Read once per stop and frame, dropped when the inferior continues
+        self.registers = None
+        self.registers_frame = None
+        gdb.events.cont.connect(self.on_cont)
+        gdb.events.register_changed.connect(self.on_cont)
+
+        self.breakpoint_index = BreakpointIndex()
+        # Indexes kept on disk for the next session
+        self.store = IndexStore()
+
+        self.source_cache = SourceCache(store=self.store)
+
+        self.highlighter = SyntaxHighlighter(store=self.store)
+
+        # The lines with code in each symtab, and their addresses for --asm
+        self.line_tables = LineTables(self.store)
+        gdb.events.new_objfile.connect(self.line_tables.clear)
+        gdb.events.clear_objfiles.connect(self.line_tables.clear)
+
+        # Trigram bitmaps of every source file for List /pattern
+        self.search = SourceSearch(self.store)
+        gdb.events.new_objfile.connect(self.search.on_objfiles_changed)
+        gdb.events.clear_objfiles.connect(self.search.on_objfiles_changed)
+
+        # Samples of where the program runs, see List-profile and List --heat; the other stop
+        # listeners below skip its sample stops
+        self.profiler = LineProfiler()
+
+        # Warms the source cache for the frames around a stop
+        self.prefetcher = SourcePrefetcher(self.source_cache, self.highlighter, profiler=self.profiler)
+        gdb.events.stop.connect(self.prefetcher.on_stop)
+        gdb.events.before_prompt.connect(self.prefetcher.on_before_prompt)
+
+        # The file and lines shown by the last List, which List without arguments continues from
+        self.last_listed = None
+        self.list_anchor = None
+        gdb.events.stop.connect(self.on_stop)
+
+        # Rendered listings of the current stop, keyed by file, lines and the breakpoint/stop generations
+        self.render_cache = OrderedDict()
+        self.render_cache_size = 32
+        self.stop_generation = 0
+        gdb.events.new_objfile.connect(self.on_new_objfile)
+        gdb.events.memory_changed.connect(self.on_memory_changed)
+        gdb.events.breakpoint_created.connect(self.on_breakpoints_changed)
+        gdb.events.breakpoint_modified.connect(self.on_breakpoints_changed)
+        gdb.events.breakpoint_deleted.connect(self.on_breakpoints_changed)
+
+        # Values of the listed expressions for List --values
+        self.values = ValueAnnotator(self.extract_max_variable_combinations)
+        gdb.events.stop.connect(self.on_stop_invalidate(self.values))
+        for event in (gdb.events.cont, gdb.events.memory_changed, gdb.events.register_changed):
+            event.connect(self.values.invalidate)
+
+        # Instructions per function for List --asm, kept until the objfiles change
+        self.disassembly = DisassemblyCache(self.line_tables)
+        gdb.events.new_objfile.connect(self.disassembly.clear)
+        gdb.events.clear_objfiles.connect(self.disassembly.clear)
+        gdb.events.memory_changed.connect(self.disassembly.on_memory_changed)
+
+        # Where each thread sits, for List --threads, collected once per stop
+        self.threads = ThreadLocations()
+        gdb.events.stop.connect(self.on_stop_invalidate(self.threads))
+        for event in (gdb.events.cont, gdb.events.new_thread, gdb.events.exited):
+            event.connect(self.threads.invalidate)
+
+        # Phase timings, see List-stats
+        self.stats = ListStats(self)
+
         super(EnhancedListCommand, self).__init__("List", gdb.COMMAND_FILES)
         gdb.execute("alias L = List")
 
@@ -66,35 +2167,44 @@ class EnhancedListCommand(gdb.Command):
         else:
             return ""
 
-    def extract_max_variable_combinations(statement):
-        # Refined regex to capture maximum variable combinations, including dereference '*'
-        # C keywords to exclude from variable results
-        C_KEYWORDS = {
-            "auto", "break", "case", "char", "const", "continue", "default", "do", "double", "else",
-            "enum", "extern", "float", "for", "goto", "if", "inline", "int", "long", "register",
-            "restrict", "return", "short", "signed", "sizeof", "static", "struct", "switch", "typedef",
-            "union", "unsigned", "void", "volatile", "while", "_Alignas", "_Alignof", "_Atomic", "_Bool",
-            "_Complex", "_Generic", "_Imaginary", "_Noreturn", "_Static_assert", "_Thread_local"
-        }
-        variable_pattern = r'''
-            (\*+)?                           # Pointer dereference(s) (e.g., *a or **a)
-            [a-zA-Z_][a-zA-Z0-9_]*           # Base variable name
-            (
-                (\.[a-zA-Z_][a-zA-Z0-9_]*)+   # Struct member access (e.g., a.b.c)
-                | (\->[a-zA-Z_][a-zA-Z0-9_]*)+ # Pointer dereference (e.g., ptr->field)
-                | (\[[^\[\]]+\])+             # Array subscript (e.g., arr[i][j])
-            )*                               # Allow chaining
-        '''
+    # C keywords to exclude from variable results
+    C_KEYWORDS = {
+        "auto", "break", "case", "char", "const", "continue", "default", "do", "double", "else",
+        "enum", "extern", "float", "for", "goto", "if", "inline", "int", "long", "register",
+        "restrict", "return", "short", "signed", "sizeof", "static", "struct", "switch", "typedef",
+        "union", "unsigned", "void", "volatile", "while", "_Alignas", "_Alignof", "_Atomic", "_Bool",
+        "_Complex", "_Generic", "_Imaginary", "_Noreturn", "_Static_assert", "_Thread_local"
+    }
+
+    # Refined regex to capture maximum variable combinations, including dereference '*'
+    VARIABLE_PATTERN = re.compile(r'''
+        (?<![\w.])                          # Not the tail of a number or a longer name (e.g., 0x10, 1.5f)
+        (\*+)?                           # Pointer dereference(s) (e.g., *a or **a)
+        [a-zA-Z_][a-zA-Z0-9_]*           # Base variable name
+        (
+            (\.[a-zA-Z_][a-zA-Z0-9_]*)+   # Struct member access (e.g., a.b.c)
+            | (\->[a-zA-Z_][a-zA-Z0-9_]*)+ # Pointer dereference (e.g., ptr->field)
+            | (\[\s*([a-zA-Z_][a-zA-Z0-9_]*|\d+)\s*\])+  # Array subscript by a name or a number (e.g., arr[i][2])
+        )*                               # Allow chaining
+        (?!\w)(?!\s*\()                    # Not a function call
+    ''', re.VERBOSE)
+
+    # String and character literals and comments, which are not searched for variables
+    LITERAL_PATTERN = re.compile(r'"(\\.|[^"\\])*"|\'(\\.|[^\'\\])*\'|//.*$|/\*.*?(\*/|$)')
+
+    def extract_max_variable_combinations(self, statement):
+        if statement.lstrip().startswith("#"):
+            return []
 
         # Match all potential variable patterns
-        matches = re.finditer(variable_pattern, statement, re.VERBOSE)
+        matches = self.VARIABLE_PATTERN.finditer(self.LITERAL_PATTERN.sub(" ", statement))
 
         # Extract matches and filter out C keywords
         seen = set()
         variables = []
         for match in matches:
             var = match.group(0).strip()
-            if var and var not in seen and var not in C_KEYWORDS:
+            if var and var not in seen and var not in self.C_KEYWORDS:
                 seen.add(var)
                 variables.append(var)
 
@@ -107,42 +2217,36 @@ class EnhancedListCommand(gdb.Command):
     #     func_call(a.b.c, arr[i], ptr->field->nested);
     #     return struct_obj->member.array[5];
     # '''
-    # variables = extract_max_variable_combinations(statement)
-
-    def get_flags(self, instruction):
-        cmd = "info registers eflags"
-        output = gdb.execute(cmd, to_string=True).split('[')
-        result = output[1].replace("[", "").replace("]", "").strip().split(" ")
-
-        all_flags = ['CF', 'ZF', 'SF', 'OF', 'PF']
-
-        for flag in all_flags:
-            if flag in result:
-                exec(f"self.{flag}=1")
-            else:
-                exec(f"self.{flag}=0")
-        cmd = "p $ecx"
-        output = gdb.execute(cmd, to_string=True).split("=")[1].strip()
-        exec(f"self.ECX={output}")
-        instruction = instruction.strip().upper()
-        result = eval(self.x86_jump_conditions[instruction])
-        return result
+    # variables = self.extract_max_variable_combinations(statement)
 
-    def max_digits_in_dict(self, breakpoints):
-        # Get all the numbers from the dictionary
+    def get_registers(self):
+        try:
+            frame = gdb.selected_frame()
+            if self.registers is None or self.registers_frame != frame:
+                self.registers = RegisterSnapshot(frame)
+                self.registers_frame = frame
+        except (gdb.error, ValueError):
+            # No running process, or no x86 registers
+            return None
 
-        max_length = 0
+        return self.registers
 
-        for value in breakpoints.values():
-            new_length = len(str(value.sequence_number))
-            if new_length > max_length:
-                max_length = new_length
+    def get_flags(self, instruction):
+        registers = self.get_registers()
+        if registers is None:
+            return None
 
-        return max_length
+        instruction = instruction.strip().upper()
+        return self.x86_jump_conditions[instruction](registers)
 
     class BreakpointState:
-        def __init__(self, line_number, sequence_number, active=True, conditional=False, condition="", hit_times=0):
+        __slots__ = ("line_number", "conditional", "active", "sequence_number", "condition", "hit_times",
+                     "requested_line")
+
+        def __init__(self, line_number, sequence_number, active=True, conditional=False, condition="", hit_times=0,
+                     requested_line=None):
             self.line_number = line_number
+            self.requested_line = requested_line
             self.conditional = conditional
             self.active = active
             self.sequence_number = sequence_number
@@ -163,16 +2267,6 @@ class EnhancedListCommand(gdb.Command):
         def show(self):
             print(f"condifional: {self.conditional}\nactive: {self.active}\nbreak number: {self.sequence_number}\n")
 
-    def get_hit_times(self, line):
-
-        hit_times = 0
-        pattern = r"^\s*breakpoint already hit\s+(\d+)\s+time.*$"
-        match = re.match(pattern, line)
-        if match:
-            hit_times = int(match.group(1))
-
-        return hit_times
-
     def filter_condition(self, breakpointer_state, line_number, active, conditional):
         return breakpointer_state.line_number == line_number and breakpointer_state.active == active and breakpointer_state.conditional == conditional
 
@@ -189,385 +2283,922 @@ class EnhancedListCommand(gdb.Command):
 
         return result  # Output: [1, 2, 3]
 
-    def separate(self, all_breakpoints, breakpoints):
+    def get_breakpoints(self, path, start_line=None, end_line=None):
+        """
+        If breakpoints are set multiple times at the same line, if anyone of them is active, then the breakpoint is active.
+        If the breakpoint is actibe or inactive, the corresponding breakpoint sequence number always shows the one that set the latest.
 
-        breakpoint_dict = {}
+        The lines between start_line and end_line of the file at path are looked up in self.breakpoint_index
+        instead of parsing `i b`.
+        """
 
-        for breakpoint in all_breakpoints:
-            break_info = [breakpoint.sequence_number, breakpoint.active, breakpoint.conditional, breakpoint.condition,
-                          breakpoint.hit_times]
+        return self.breakpoint_index.query(path, start_line, end_line)  # breakpoints is a dict of classes. sorted_breakpoint_dict is a dict of list
 
-            if breakpoint.line_number not in breakpoint_dict or breakpoint_dict[breakpoint.line_number] is None:
-                breakpoint_dict[breakpoint.line_number] = []
+    def get_lines_to_list(self):
+        # `set listsize unlimited` reads as None, and like gdb lists INT_MAX lines: the whole file
+        lines_to_list = gdb.parameter("listsize")
+        return lines_to_list if lines_to_list else 2 ** 31 - 1
 
-            breakpoint_dict[breakpoint.line_number].append(break_info)
+    def get_current_location(self):
+        # The line of the selected frame or, without a running process, gdb's default source line
+        try:
+            sal = gdb.selected_frame().find_sal()
+            if sal.symtab is not None:
+                return sal.symtab, sal.line
+        except gdb.error:
+            pass
+
+        sals = gdb.decode_line()[1]
+        if not sals or sals[0].symtab is None:
+            raise gdb.error("No current source file.")
+
+        return sals[0].symtab, sals[0].line
+
+    def resolve_location(self, argument, symtab, line):
+        # Plain line numbers are relative to the file listed last, and +N/-N to `line`, like `list` does
+        argument = argument.strip()
+        if argument.isdigit():
+            return symtab, int(argument)
+        if argument[:1] in ("+", "-") and argument[1:].strip().isdigit():
+            return symtab, max(line + int(argument[0] + argument[1:].strip()), 1)
+
+        remainder, sals = gdb.decode_line(argument)
+        if remainder:
+            raise gdb.error(f"Junk at end of line specification: {remainder}")
+        if not sals:
+            raise gdb.error(f"No line number information available for \"{argument}\".")
+
+        # An ambiguous location lists the one in the current file
+        for sal in sals:
+            if sal.symtab is not None and sal.symtab.fullname() == symtab.fullname():
+                return sal.symtab, sal.line
+
+        if sals[0].symtab is None:
+            raise gdb.error(f"No line number information available for \"{argument}\".")
+
+        return sals[0].symtab, sals[0].line
+
+    def split_range(self, argument):
+        # `first,last` with the comma outside of any parentheses, e.g. not in `foo(int, int)`
+        depth = 0
+        for i, character in enumerate(argument):
+            if character == '(':
+                depth += 1
+            elif character == ')':
+                depth -= 1
+            elif character == ',' and depth == 0:
+                return argument[:i].strip(), argument[i + 1:].strip()
 
-        sorted_breakpoint_dict = {}
+        return None
 
-        for key, value in breakpoint_dict.items():
+    def on_stop(self, event):
+        # A sample of List-profile changes nothing the user looks at
+        if self.profiler.is_sample_stop(event):
+            return
 
-            left_value = []
+        # The first List after a stop is centered around the new location
+        self.last_listed = None
+        self.registers = None
+        self.stop_generation += 1
+        self.render_cache.clear()
+
+    def on_stop_invalidate(self, cache):
+        # A stop listener that drops the cache, except at the stops of List-profile
+        def on_stop(event):
+            if not self.profiler.is_sample_stop(event):
+                cache.invalidate(event)
+        return on_stop
+
+    def on_cont(self, event):
+        self.registers = None
+        self.stop_generation += 1
+        self.render_cache.clear()
+
+    def getscope(self, argument, stream=None):
+        """
+        Works out which lines `list <argument>` would show, without running it.
+        Returns the symtab and the first and last line numbers, or Nones after reporting the error on stream
+        (gdb's standard output by default).
+        """
+        try:
+            argument = argument.strip()
+            lines_to_list = self.get_lines_to_list()
+
+            symtab, line = self.get_current_location()
+            anchor = (symtab.fullname(), line)
+            if anchor != self.list_anchor:
+                # A new frame was selected since the last List
+                self.list_anchor = anchor
+                self.last_listed = None
+
+            if argument in ("", "+", "-") and self.last_listed is not None:
+                symtab, first_listed, last_listed = self.last_listed
+
+                if argument == "-":
+                    if first_listed == 1:
+                        raise gdb.error(f"Already at the start of {symtab.filename}.")
+                    first_line_number = max(first_listed - lines_to_list, 1)
+                    last_line_number = first_listed - 1
+                else:
+                    first_line_number = last_listed + 1
+                    last_line_number = first_line_number + lines_to_list - 1
 
-            for row in value:
-                if row[0] != breakpoints[key].sequence_number:
-                    left_value.append(row)
+            elif argument in ("", "+", "-", "."):
+                first_line_number = max(line - lines_to_list // 2, 1)
+                if argument == "-":
+                    first_line_number = max(first_line_number - lines_to_list, 1)
+                last_line_number = first_line_number + lines_to_list - 1
 
-            sorted_breakpoint = sorted(left_value, key=lambda x: (not x[1], x[0]))
-            sorted_breakpoint_dict[key] = sorted_breakpoint
+            else:
+                # Offsets count from the last line listed
+                if self.last_listed is not None:
+                    symtab, _, line = self.last_listed
+
+                scope = self.split_range(argument)
+                if scope is None:
+                    symtab, line = self.resolve_location(argument, symtab, line)
+                    first_line_number = max(line - lines_to_list // 2, 1)
+                    last_line_number = first_line_number + lines_to_list - 1
+                else:
+                    first, last = scope
+                    if first:
+                        symtab, first_line_number = self.resolve_location(first, symtab, line)
+                        if last:
+                            # `first,+N` counts from the first line
+                            symtab, last_line_number = self.resolve_location(last, symtab, first_line_number)
+                            if last_line_number < first_line_number:
+                                raise gdb.error(f"Second line {last_line_number} is before the first line "
+                                                f"{first_line_number}.")
+                        else:
+                            last_line_number = first_line_number + lines_to_list - 1
+                    else:
+                        symtab, last_line_number = self.resolve_location(last, symtab, line)
+                        first_line_number = max(last_line_number - lines_to_list + 1, 1)
 
-        return sorted_breakpoint_dict
+            source = self.source_cache.get(symtab.fullname())
+            if source.clamp_line(first_line_number) < first_line_number:
+                raise gdb.error(f"Line number {first_line_number} out of range; "
+                                f"\"{symtab.filename}\" has {source.clamp_line(first_line_number)} lines.")
 
-    def get_breakpoints(self, filename):
-        """
-        The breakpoints returned from gdb.breakpoints() are not correct
-        If breakpoints are set multiple times at the same line, if anyone of them is active, then the breakpoint is active.
-        If the breakpoint is actibe or inactive, the corresponding breakpoint sequence number always shows the one that set the latest.
-        """
+            last_line_number = source.clamp_line(last_line_number)
+            self.last_listed = (symtab, first_line_number, last_line_number)
 
-        cmd = "i b"
-        output = gdb.execute(cmd, to_string=True)
-        lines = output.splitlines()
+            return symtab, first_line_number, last_line_number
+        except Exception as e:
+            if stream is None:
+                print(f"Error: {e}")
+            else:
+                gdb.write(f"Error: {e}\n", stream)
+            return None, None, None
 
-        breakpoints = {}
+    def repeated_space(self, length):
+        return " " * length
 
-        pattern = rf"^\s*(\d+).*\s+keep\s+([yn])\s+.*{filename}:(\d+)\s*$"
-        pattern_cond = r"^\s*(stop only if.*)$"  # conditioanl breakpoint
-        total_lines = len(lines)
+    def compose_breakpoint_prefix(self, i, maxlen):
+        return str(i).rjust(maxlen)
 
-        all_breakpoints = []
+    def get_hit_times_message(self, times):
+        return "(" + "hit " + str(times) + " time" + ("" if times == 1 else "s") + ")"
 
-        try:
-            for i in range(total_lines):
-                line = lines[i]
+    def get_asm_jump_state(self, file_type, line):
 
-                matched = False
+        if file_type == "asm":
 
-                line_number = -1
-                breakpoint_number = -1
-                active = None
-                cond = None
-                condition = ""
-                hit_times = 0
+            opcode = self.get_assembly_opcode(line)
+            if opcode in self.x86_jump_conditions:
+                return (self.get_flags(opcode))
 
-                match = re.match(pattern, line)
-                if match:
-                    matched = True
-                    breakpoint_number = int(match.group(1))
-                    active = match.group(2) == 'y'
-                    line_number = int(match.group(3))
+        return None
 
-                    cond = False
-                    condition = ""
-                    hit_times = 0
+    def get_instruction_jump_state(self, architecture_name, text):
+        # Same as get_asm_jump_state, for an instruction as gdb disassembles it
+        if not architecture_name.startswith(("i386", "i8086")):
+            return None
 
-                    if i < total_lines - 1:
+        words = text.split()
+        while words and words[0] in self.INSTRUCTION_PREFIXES:
+            words.pop(0)
 
-                        next_line = lines[i + 1]
+        opcode = words[0].upper() if words else ""
+        if opcode in self.x86_jump_conditions:
+            return self.get_flags(opcode)
 
-                        match = re.match(pattern_cond, next_line)
-                        if match:
+        return None
 
-                            cond = True
-                            condition = match.group(1)
+    def highlight(self, source, file_type, lines, start_line):
+        return self.highlighter.highlight(source, file_type, lines, start_line)
 
-                            if i < total_lines - 2:
-                                hit_times = self.get_hit_times(lines[i + 2])
-                        else:
-                            hit_times = self.get_hit_times(lines[i + 1])
+    def render_window(self, filename, file_type, source, start_line, end_line, next_line, color, deadline=None,
+                      disassembly=None, threads=None, heat=None, executable=None):
+        # Reads the lines and works out the values, highlighting and instructions that render() shows with them
+        lines = self.read_lines(source, start_line, end_line)
+        values = self.values.annotate(source, lines, start_line, deadline) if deadline is not None else None
+        if color and self.highlighter.enabled():
+            highlighted = self.highlight(source, file_type, lines, start_line)
+        else:
+            highlighted = None
 
+        if disassembly is not None:
+            architecture, symtab, pc = disassembly
+            instructions = self.disassembly.get_instructions(architecture, symtab, start_line, end_line)
+            disassembly = (architecture.name(), instructions, pc)
 
-                else:
-                    pattern = rf"^\s*(\d+).*\s+keep\s+([yn])\s+.*{filename}:(\d+)\s*$"
-                    pattern_cond = r"^\s*(stop only if.*)$"  # conditioanl breakpoint
-                    pattern_sub_mult = rf"^\s*(\d+\.\d+)\s+([yn])\s+.*\s+at\s+{filename}:(\d+)\s*$"
-                    pattern_mult = r"\s*(\d+)\s+breakpoint\s+keep\s+(\S)\s+<MULTIPLE>.*$"
-                    match = re.match(pattern_mult, line)
-                    if match:
-                        matched = True
-                        breakpoint_number = int(match.group(1))
-
-                        active = match.group(2) == 'y'
-                        cond = False
-                        condition = ""
-
-                        if i < total_lines - 2:
-                            line = lines[i + 1]
-                            match = re.match(pattern_cond, line)
-
-                            if match:
-                                cond = True
-                                condition = match.group(1)
-                                j = i + 2
-                            else:
-                                j = i + 1
-
-                        if j < total_lines - 1:
-                            line = lines[j]
-                            match = re.match(pattern_sub_mult, line)
-
-                            if match:
-                                line_number = int(match.group(3))
-
-                if matched:
-
-                    new_breakpoint = self.BreakpointState(line_number, breakpoint_number, active, cond, condition,
-                                                          hit_times)
-                    all_breakpoints.append(new_breakpoint)
-
-                    if line_number in breakpoints:
-                        replacement = (not cond and active) or (
-                                not cond and not active and breakpoints[line_number].conditional and not
-                        breakpoints[line_number].active) or (
-                                              cond and active and not breakpoints[line_number].active)
-
-                        if replacement or breakpoints[line_number] == new_breakpoint:
-                            breakpoints[line_number] = new_breakpoint
+        return self.render(filename, file_type, lines, start_line, end_line, next_line, color, values, highlighted,
+                           disassembly, threads, heat, executable, source.path)
 
-                    else:
-                        breakpoints[line_number] = new_breakpoint
+    def render(self, filename, file_type, lines, start_line, end_line, next_line, color=True, values=None,
+               highlighted=None, disassembly=None, threads=None, heat=None, executable=None, path=None):
+        """
+        Builds the whole listing as one string, with the breakpoints of the file at path (filename by default).
+        The gutter widths are worked out once from the plain text, and with color off no escape codes are produced
+        at all.
+        """
 
+        # ANSI color codes
+        if color:
+            RED = "\033[31m"
+            DARKRED = "\033[35m"
+            GREEN = "\033[32m"
+            RESET = "\033[0m"
+            YELLOW = "\033[33m"
+            CYAN = "\033[36m"
+        else:
+            RED = DARKRED = GREEN = RESET = YELLOW = CYAN = ""
 
+        if path is None:
+            path = filename
+        breakpoints, breakpoint_dict = self.get_breakpoints(path, start_line, end_line)
 
+        length_breakpoints = self.breakpoint_index.max_digits(path)
 
-        except Exception as e:
-            print(f"Error: {e}")
+        leading_spaces = self.repeated_space(length_breakpoints)
 
-        sorted_breakpoint_dict = self.separate(all_breakpoints, breakpoints)
+        # The number of threads at a line and '▹', ahead of the breakpoint columns
+        length_threads = 0
+        if threads:
+            length_threads = len(str(max(len(numbers) for numbers in threads.values()))) + 1
+        thread_spaces = self.repeated_space(length_threads)
 
-        return breakpoints, sorted_breakpoint_dict  # breakpoints is a list of classes. sorted_breakpoint_dict is a dict of list
+        # The share of the samples and a bar scaled to the hottest line, ahead of everything else
+        length_heat = 0
+        if heat is not None:
+            histogram, samples = heat
+            hottest = max(histogram)
+            length_heat = 8
+        heat_spaces = self.repeated_space(length_heat)
 
-    def getfilename(self):
+        # '·' on the lines that have code, when the line table is known
+        length_executable = 1 if executable is not None else 0
 
-        try:
-            cmd = "i source"
-            output = gdb.execute(cmd, to_string=True)
-            lines = output.splitlines()
-            line = lines[0].rstrip()
+        # The breakpoints asked for at lines without code, which gdb placed further down
+        moved = self.breakpoint_index.query_moved(path, start_line, end_line)
 
-            if line != "No current source file.":
-                filename = lines[0].rstrip().split(' ')[-1]
-                file_type = filename.split('.')[-1]
-                line = lines[2].rstrip()
-                pattern = r"^\s*Located in\s+(\S+.*)$"
-                match = re.match(pattern, line)
-                if match:
-                    path = match.group(1)
+        # Heat, thread count, breakpoint number, '●'/'○', '?', the next line arrow and '·'
+        gutter = length_heat + length_threads + length_breakpoints + 4 + length_executable
 
-                return filename, path, file_type
-            else:
-                raise RuntimeError("No current source file.")
+        output = []
 
-        except Exception as e:
-            return "", "", ""
+        # Display lines with annotations and color
+        for i in range(start_line, end_line + 1):
+            line = lines[i - start_line].rstrip()
+            text = line
+            number = f"{i:4}"
+            suffix = ""
+            jump_string = ""
+            is_next_line = next_line is not None and i == next_line
 
-    def getscope(self, argument, filename):
-        try:
-            cmd = "list " + argument
-            output = gdb.execute(cmd, to_string=True)
+            if i in breakpoints:
+                breakpoint = breakpoints[i]
+
+                if breakpoint.active:
+                    line_color = RED
+                    glyph = "●"  # Mark breakpoint lines
+                else:
+                    line_color = DARKRED
+                    glyph = "○"  # Mark breakpoint lines
 
-            lines = output.splitlines()
-            first_line = lines[0]
-            last_line = lines[-1]
-            # line_number_pattern = re.compile(r"^(\d+):\s*")
+                arrow = f"{GREEN}—▸{line_color}" if is_next_line else "  "  # Mark next line to execute
 
-            first_line_number = None
-            last_line_number = None
+                prefix = (f"{RESET}{self.compose_breakpoint_prefix(breakpoint.sequence_number, length_breakpoints)}"
+                          f"{RED}{glyph}{'?' if breakpoint.conditional else ' '}{line_color}{arrow}")
 
-            match = re.match(r'^\s*(\d+)\s*', first_line)
-            if match:
-                first_line_number = match.group(1)
+                if breakpoint.conditional:
+                    suffix = f"\t{YELLOW}({breakpoint.get_condition()})"
+
+                if breakpoint.hit_times > 0:
+                    suffix += f"\t{YELLOW}{self.get_hit_times_message(breakpoint.get_hit_times())}"
+
+            elif is_next_line:
+                prefix = f"{GREEN}{leading_spaces}  —▸"  # Mark next line to execute
             else:
+                prefix = f"{RESET}{leading_spaces}    "
+
+                # Breakpoint lines and the next line keep their own color
+                if highlighted is not None:
+                    text = highlighted[i - start_line]
+
+            # Every conditional jump in the window, from the same register snapshot
+            jump_state = self.get_asm_jump_state(file_type, line)
+            if jump_state is not None:
+                if jump_state:
+                    jump_string = f"\t{YELLOW}(will jump)"
+                else:
+                    jump_string = f"\t{YELLOW}(will not jump)"
+
+            # Where a breakpoint on a line without code goes, naming the ones that were asked for here
+            if i in moved:
+                suffix += "".join(f"\t{YELLOW}(breakpoint {state.sequence_number} placed at line {state.line_number})"
+                                  for state in moved[i])
+            elif length_executable and i not in executable and line.strip():
+                placement = executable.placement(i)
+                if placement is not None:
+                    suffix += f"\t{YELLOW}(a breakpoint here is placed at line {placement})"
+
+            if values and i in values:
+                suffix += f"\t{CYAN}{values[i]}"
+
+            if length_threads:
+                thread_numbers = threads.get(i)
+                if thread_numbers:
+                    shown = ", ".join(str(number) for number in thread_numbers[:self.THREADS_SHOWN])
+                    more = ", …" if len(thread_numbers) > self.THREADS_SHOWN else ""
+                    prefix = f"{GREEN}{len(thread_numbers):>{length_threads - 1}}▹{prefix}"
+                    suffix += f"\t{GREEN}[thread{'s' if len(thread_numbers) > 1 else ''} {shown}{more}]"
+                else:
+                    prefix = thread_spaces + prefix
+
+            if length_heat:
+                samples_at_line = histogram[i] if i < len(histogram) else 0
+                if samples_at_line:
+                    bar = self.HEAT_BARS[-(-samples_at_line * len(self.HEAT_BARS) // hottest) - 1]
+                    heat_color = RED if samples_at_line * 2 > hottest else YELLOW
+                    prefix = f"{heat_color}{samples_at_line * 100 / samples:5.1f}%{bar} {prefix}"
+                else:
+                    prefix = heat_spaces + prefix
 
-                start_line = None
-                end_line = None
+            if length_executable:
+                number = ("·" if i in executable else " ") + number
 
-                file_pattern = rf"^\s*file:\s+\"{filename}\""
+            output.append(f"{prefix}{number}: {text}{suffix}{jump_string}{RESET}")
 
-                i = 0
-                while (not re.match(file_pattern, lines[i])):
-                    i += 1
+            # The other breakpoints at this line, aligned under the end of the source text
+            all_breakpoints_in_the_line = breakpoint_dict.get(i)
+            if all_breakpoints_in_the_line:
+                spaces = " " * (gutter - length_executable + len(number) + 2 + len(line))
+                maxlen = max(len(str(row[0])) for row in all_breakpoints_in_the_line)
 
-                i += 1
-                start_line = i
+                for row in all_breakpoints_in_the_line:
+                    hit_times = self.get_hit_times_message(row[-1]) if row[-1] > 0 else ""
+                    condition = ("  " + row[3]) if row[3] != "" else ""
 
-                while (i < len(lines) and not re.match(r"^\s*file:\s+\"", lines[i])):
-                    i += 1
+                    output.append(f"{spaces}\t{YELLOW}({RED}{self.repeated_space(maxlen - len(str(row[0])))}{RESET}"
+                                  f"{row[0]}{RED}{'●' if row[1] else '○'}{'?' if row[2] else ''}{YELLOW}"
+                                  f"{condition})\t{hit_times}{RESET}")
 
-                end_line = i - 1
+            # The instructions of this line, with the current one marked
+            if disassembly is not None and i in disassembly[1]:
+                architecture_name, instructions, pc = disassembly
+                spaces = " " * gutter
 
-                first_line = lines[start_line]
-                last_line = lines[end_line]
+                for address, function_start, instruction in instructions[i]:
+                    marker = f"{GREEN}=> " if address == pc else "   "
+                    jump_string = ""
+                    jump_state = self.get_instruction_jump_state(architecture_name, instruction)
+                    if jump_state is not None:
+                        jump_string = f"\t{YELLOW}(will jump)" if jump_state else f"\t{YELLOW}(will not jump)"
 
-                match = re.match(r'^\s*(\d+)\s*', first_line)
-                if match:
-                    first_line_number = match.group(1)
-            match = re.search(r'^\s*(\d+)\s*', last_line)
+                    output.append(f"{spaces}{marker}{address:#x} <+{address - function_start}>:\t{instruction}"
+                                  f"{jump_string}{RESET}")
 
-            if match:
-                last_line_number = match.group(1)
+        return "\n".join(output)
 
-            return int(first_line_number), int(last_line_number)
-        except Exception as e:
-            print(f"Error: {e}")
-            return None, None
+    def get_chunk_size(self):
+        # A screenful when gdb pages the output
+        height = gdb.parameter("height") if gdb.parameter("pagination") else None
+        return height if height else 1000
 
-    def repeated_space(self, length):
-        return ''.join(" " for _ in range(length))
+    def render_chunks(self, filename, file_type, source, start_line, end_line, next_line, color, chunk_size,
+                      deadline=None, disassembly=None, threads=None, heat=None, executable=None):
+        # Reads and renders start_line..end_line lazily, chunk_size source lines at a time
+        for chunk_start in range(start_line, end_line + 1, chunk_size):
+            chunk_end = min(chunk_start + chunk_size - 1, end_line)
+            yield self.render_window(filename, file_type, source, chunk_start, chunk_end, next_line, color, deadline,
+                                     disassembly, threads, heat, executable)
 
-    def compose_breakpoint_prefix(self, i, maxlen):
-        return self.repeated_space(maxlen - len(str(i))) + str(i)
+    def on_breakpoints_changed(self, breakpoint):
+        self.render_cache.clear()
 
-    def len_no_ansi(self, string):
-        return len(re.sub(
-            r'[\u001B\u009B][\[\]()#;?]*((([a-zA-Z\d]*(;[-a-zA-Z\d\/#&.:=?%@~_]*)*)?\u0007)|((\d{1,4}(?:;\d{0,4})*)?[\dA-PR-TZcf-ntqry=><~]))',
-            '', string))
+    def on_memory_changed(self, event):
+        # Only listings with --values depend on memory
+        self.render_cache.clear()
 
-    def get_asm_jump_state(self, file_type, line):
+    def on_new_objfile(self, event):
+        self.stop_generation += 1
+        self.render_cache.clear()
 
-        if file_type == "asm":
+    def parse_options(self, arg):
+        # Leading --options, followed by the usual `list` argument, or a /pattern kept as typed
+        options = set()
+        arg = arg.strip()
 
-            opcode = self.get_assembly_opcode(line)
-            if opcode in self.x86_jump_conditions:
-                return (self.get_flags(opcode))
+        while arg.startswith("--"):
+            option, _, arg = arg.partition(" ")
+            option = option[2:]
+            arg = arg.lstrip()
+            if option not in self.OPTIONS:
+                raise gdb.GdbError(f"Unknown option --{option}. Options: "
+                                   + ", ".join("--" + name for name in sorted(self.OPTIONS)))
+            options.add(option)
 
-        return None
+        return options, arg
+
+    def read_source(self, path):
+        return self.source_cache.get(path)
+
+    def save_indexes(self, source):
+        # What this listing added to the indexes of a large file, for the next session
+        self.source_cache.save(source)
+        self.highlighter.save(source)
+
+    def read_lines(self, source, start_line, end_line):
+        # Only the listed lines are decoded
+        return source.get_lines(start_line, end_line)
 
     def invoke(self, arg, from_tty):
-        # try:
-        # ANSI color codes
-        RED = "\033[31m"
-        DARKRED = "\033[35m"
-        GREEN = "\033[32m"
-        RESET = "\033[0m"
-        YELLOW = "\033[33m"
+        options, arg = self.parse_options(arg)
+
+        if "stats" in options or self.stats.enabled:
+            # --stats times just this invocation when List-stats is off
+            once = not self.stats.enabled
+            if once:
+                self.stats.enable()
+            try:
+                self.stats.begin()
+                self.list_lines(arg, options)
+            finally:
+                elapsed, phases = self.stats.end(arg)
+                if once:
+                    self.stats.disable()
+
+            if "stats" in options:
+                gdb.write(f"{elapsed * 1000:.3f} ms: {self.stats.format_phases(phases)}\n")
+
+        else:
+            self.list_lines(arg, options)
 
-        # Determine the current frame
+    def get_frame_location(self, path):
+        # The next line of the selected frame when it is in path, its pc and its architecture
+        next_line = None
+        pc = None
+        architecture = None
 
         try:
             frame = gdb.selected_frame()
-            if frame:
-
-                sal = frame.find_sal()
-                if sal and sal.symtab:
-                    filename = sal.symtab.filename
-                    path = sal.symtab.fullname()
-                    next_line = sal.line
-                    file_type = filename.split('.')[-1]
-        except:
-            filename, path, file_type = self.getfilename()
-            next_line = None
+            pc = frame.pc()
+            architecture = frame.architecture()
+            sal = frame.find_sal()
+            if sal.symtab is not None and sal.symtab.fullname() == path:
+                next_line = sal.line
+        except gdb.error:
+            pass
+
+        return next_line, pc, architecture
+
+    def export_records(self, symtab, start_line, end_line, chunk_size=1000):
+        """
+        Yields one dict per line start_line..end_line with what List shows about it, reading and
+        querying the breakpoints chunk_size lines at a time.
+        """
+
+        filename = symtab.filename
+        path = symtab.fullname()
+        file_type = filename.split('.')[-1]
+        next_line = self.get_frame_location(path)[0]
+        source = self.read_source(path)
+
+        for chunk_start in range(start_line, end_line + 1, chunk_size):
+            chunk_end = min(chunk_start + chunk_size - 1, end_line)
+            lines = self.read_lines(source, chunk_start, chunk_end)
+            breakpoints, breakpoint_dict = self.get_breakpoints(path, chunk_start, chunk_end)
+            moved = self.breakpoint_index.query_moved(path, chunk_start, chunk_end)
+            executable = self.line_tables.get_executable(symtab, chunk_start, chunk_end)
+
+            for i in range(chunk_start, chunk_start + len(lines)):
+                line = lines[i - chunk_start]
+                record = {"file": filename, "path": path, "line": i, "text": line.rstrip("\r"),
+                          "next": i == next_line}
+
+                if executable is not None:
+                    record["executable"] = i in executable
+                    if i not in executable and executable.placement(i) is not None:
+                        record["placed_at"] = executable.placement(i)
+
+                if i in breakpoints:
+                    # The one shown in the gutter first, then the others as List lists them
+                    breakpoint = breakpoints[i]
+                    rows = [[breakpoint.sequence_number, breakpoint.active, breakpoint.conditional,
+                             breakpoint.condition, breakpoint.hit_times]] + breakpoint_dict.get(i, [])
+                    record["breakpoints"] = [{"number": number, "enabled": active,
+                                              "condition": condition[len("stop only if "):] if conditional else None,
+                                              "hits": hits}
+                                             for number, active, conditional, condition, hits in rows]
+
+                if i in moved:
+                    record["moved"] = [{"number": state.sequence_number, "line": state.line_number}
+                                       for state in moved[i]]
+
+                jump_state = self.get_asm_jump_state(file_type, line)
+                if jump_state is not None:
+                    record["jump"] = jump_state
+
+                yield record
+
+    def export_json(self, arg, batch_size=1000):
+        # One JSON object per line, for every `;`-separated argument, written batch_size lines at a time.
+        # Errors go to gdb's standard error so that standard output stays JSON
+        for argument in arg.split(";"):
+            symtab, start_line, end_line = self.getscope(argument, gdb.STDERR)
+            if start_line is None:
+                continue
+
+            try:
+                records = self.export_records(symtab, start_line, end_line, batch_size)
+                while True:
+                    batch = [json.dumps(record, ensure_ascii=False) for record in islice(records, batch_size)]
+                    if not batch:
+                        break
+                    gdb.write("\n".join(batch) + "\n")
+            except Exception as e:
+                gdb.write(f"Error: {e}\n", gdb.STDERR)
+                return
+
+    def list_matches(self, pattern):
+        # Every line that matches pattern, each rendered as List shows it, under its file's name
+        color = gdb.parameter("style enabled") is not False
+        found = False
+
+        try:
+            for path, source, line_numbers in self.search.search(pattern, self.source_cache):
+                found = True
+
+                # The symtab gives the file's name as gdb shows it, and the line table
+                try:
+                    symtab = gdb.decode_line(f"{path}:{line_numbers[0]}")[1][0].symtab
+                except (gdb.error, IndexError, TypeError):
+                    symtab = None
+
+                filename = symtab.filename if symtab is not None else path
+                file_type = filename.split('.')[-1]
+                next_line = self.get_frame_location(path)[0]
+
+                output = [f"{filename}:"]
+                for line_number in line_numbers:
+                    executable = self.line_tables.get_executable(symtab, line_number, line_number) \
+                        if symtab is not None else None
+                    output.append(self.render_window(filename, file_type, source, line_number, line_number, next_line,
+                                                     color, executable=executable))
+                gdb.write("\n".join(output) + "\n")
+        except re.error as e:
+            raise gdb.GdbError(f"Invalid pattern: {e}")
+
+        if not found:
+            gdb.write(f"No lines match /{pattern}/.\n")
+
+    def list_backtrace(self, arg):
+        """
+        Shows BACKTRACE_CONTEXT lines around the line of each of the innermost `arg` frames (all of
+        them without an argument), in one pass that reads every source file once.
+        """
+
+        try:
+            limit = int(arg) if arg else None
+        except ValueError:
+            raise gdb.GdbError("Usage: List --bt [N]")
+        if limit is not None and limit < 1:
+            raise gdb.GdbError("Usage: List --bt [N]")
+
+        try:
+            frame = gdb.newest_frame()
+        except gdb.error as e:
+            raise gdb.GdbError(str(e))
+
+        color = gdb.parameter("style enabled") is not False
+        sources = {}  # path -> SourceFile, or None when it cannot be read
+        output = []
+        level = 0
+
+        while frame is not None and (limit is None or level < limit):
+            sal = frame.find_sal()
+            name = frame.name() or "??"
+            symtab = sal.symtab
+
+            if symtab is None or sal.line <= 0:
+                output.append(f"#{level:<3}{name} at {frame.pc():#x}, no source")
+            else:
+                path = symtab.fullname()
+                if path not in sources:
+                    try:
+                        sources[path] = self.read_source(path)
+                    except OSError:
+                        sources[path] = None
+                source = sources[path]
+
+                output.append(f"#{level:<3}{name} at {symtab.filename}:{sal.line}")
+                if source is not None:
+                    start_line = max(sal.line - self.BACKTRACE_CONTEXT, 1)
+                    end_line = source.clamp_line(sal.line + self.BACKTRACE_CONTEXT)
+                    if start_line <= end_line:
+                        executable = self.line_tables.get_executable(symtab, start_line, end_line)
+                        output.append(self.render_window(symtab.filename, symtab.filename.split('.')[-1], source,
+                                                         start_line, end_line, sal.line, color,
+                                                         executable=executable))
+
+            frame = frame.older()
+            level += 1
+
+        gdb.write("\n".join(output) + "\n")
+
+    def list_lines(self, arg, options=()):
+        if "bt" in options:
+            if options - {"bt", "stats"}:
+                raise gdb.GdbError("--bt can only be combined with --stats.")
+            self.list_backtrace(arg)
+            return
+
+        if arg.startswith("/"):
+            # `List /pattern` or `List /pattern/`
+            pattern = arg[1:-1] if len(arg) > 2 and arg.endswith("/") else arg[1:]
+            self.list_matches(pattern)
+            return
+
+        if "json" in options:
+            if options - {"json", "stats"}:
+                raise gdb.GdbError("--json can only be combined with --stats.")
+            self.export_json(arg)
+            return
+
+        symtab, start_line, end_line = self.getscope(arg)
+
+        if start_line is None:
+            return
+
+        filename = symtab.filename
+        path = symtab.fullname()
+        file_type = filename.split('.')[-1]
+
+        next_line, pc, architecture = self.get_frame_location(path)
 
         try:
             # Read the source file
-            with open(path, "r") as source_file:
-                lines = source_file.readlines()
+            source = self.read_source(path)
         except Exception as e:
             print("Error: No current source file.")
             return
 
-        try:
-
-            start_line, end_line = self.getscope(arg, filename)
+        color = gdb.parameter("style enabled") is not False
+        chunk_size = self.get_chunk_size()
+
+        # The time --values may spend evaluating
+        deadline = perf_counter() + self.values.budget if "values" in options else None
+
+        # The instructions of each line for --asm, disassembled from the program file without a process
+        disassembly = None
+        if "asm" in options:
+            if architecture is None:
+                try:
+                    architecture = gdb.selected_inferior().architecture()
+                except (gdb.error, AttributeError):
+                    print("Error: No architecture to disassemble with.")
+                    return
+            disassembly = (architecture, symtab, pc)
+
+        # The lines of this file where threads are stopped, for --threads
+        threads = self.threads.get(path) if "threads" in options else None
+
+        # The samples of this file for --heat
+        heat = self.profiler.get_heat(path) if "heat" in options else None
+
+        # The listed lines that have code, and where breakpoints on the others go
+        executable = self.line_tables.get_executable(symtab, start_line, end_line)
+
+        if end_line - start_line + 1 > chunk_size:
+            # Large ranges are rendered and written a chunk at a time, without caching, so memory stays
+            # flat and quitting the pager (which raises out of gdb.write) stops the remaining work
+            try:
+                for output in self.render_chunks(filename, file_type, source, start_line, end_line, next_line,
+                                                 color, chunk_size, deadline, disassembly, threads, heat,
+                                                 executable):
+                    gdb.write(output + "\n")
+            except Exception as e:
+                print(f"Error: {e}")
+            finally:
+                self.save_indexes(source)
+            return
 
-            if start_line is None:
+        key = (path, source.mtime, source.size, start_line, end_line, next_line, pc, color,
+               color and self.highlighter.enabled(), deadline is not None,
+               disassembly is not None, threads is not None, heat is not None and self.profiler.samples,
+               executable is not None,
+               self.breakpoint_index.generation, self.stop_generation)
+        output = self.render_cache.get(key)
+
+        if output is None:
+            try:
+                output = self.render_window(filename, file_type, source, start_line, end_line, next_line, color,
+                                            deadline, disassembly, threads, heat, executable)
+            except Exception as e:
+                print(f"Error: {e}")
                 return
-            # Get all breakpoints
-            """
-            breakpoints = gdb.breakpoints() or []
-            bp_lines = {int(bp.location.split(":")[-1]) for bp in breakpoints if ":" in bp.location}
-            """
 
-            breakpoints, breakpoint_dict = self.get_breakpoints(filename)
+            self.save_indexes(source)
 
-            length_breakpoints = self.max_digits_in_dict(breakpoints)
-
-            leading_spaces = self.repeated_space(length_breakpoints)
+            # A listing whose values ran out of time is not kept, the next List evaluates the rest
+            if deadline is None or self.values.complete:
+                self.render_cache[key] = output
+                if len(self.render_cache) > self.render_cache_size:
+                    self.render_cache.popitem(last=False)
+        else:
+            self.render_cache.move_to_end(key)
 
-            # Display lines with annotations and color
-            for i in range(start_line, end_line + 1):
-                suffix = ""
-                other_breakpoints_message = ""
-                line = lines[i - 1]
-                jump_string = ""
+        gdb.write(output + "\n")
 
-                if i in breakpoints:
-                    message = ""
 
-                    if breakpoints[i].active:
-                        line_color = RED
-                        prefix = "●"  # Mark breakpoint lines
-                    else:
-                        line_color = DARKRED
-                        prefix = "○"  # Mark breakpoint lines
+class ListWindow:
+    """
+    A TUI window showing List's listing around the next line, for `tui new-layout ... List 1 ...`.
+    Stop and breakpoint events only mark the window stale; before the next prompt each row is
+    compared with what it showed last time (next-line arrow, breakpoint glyph, condition, hit count,
+    jump prediction) and only the rows that differ are rendered again. The window is written only
+    when its text changed, and curses then sends just the changed cells to the terminal.
+    """
 
-                    prefix = f"{RED}{prefix}"
+    ESCAPE_PATTERN = re.compile(r"(\033\[[0-9;]*m)")
+
+    def __init__(self, window, command):
+        self.window = window
+        self.command = command
+        self.top = None  # first line shown
+        self.location = None  # (path, next line) the window last followed
+        self.view = None  # what every row depends on: file version, gutter width, window width and color
+        self.rows = {}  # line number -> (signature, rendered rows)
+        self.text = None  # what the window shows now
+        self.stale = True
+
+        self.events = [(gdb.events.stop, self.on_event), (gdb.events.breakpoint_created, self.on_event),
+                       (gdb.events.breakpoint_modified, self.on_event), (gdb.events.breakpoint_deleted, self.on_event),
+                       (gdb.events.before_prompt, self.on_before_prompt)]
+        for event, handler in self.events:
+            event.connect(handler)
+
+    def close(self):
+        for event, handler in self.events:
+            event.disconnect(handler)
+
+    def on_event(self, event):
+        if isinstance(event, gdb.StopEvent) and self.command.profiler.is_sample_stop(event):
+            return
+        self.stale = True
 
-                    if breakpoints[i].conditional:
-                        prefix += '?'
-                    else:
-                        prefix += ' '
+    def on_before_prompt(self, event=None):
+        # Also catches frame changes from up/down/frame, which have no event of their own
+        self.update()
 
-                    prefix += f"{line_color}"
+    def render(self):
+        # gdb asks for the whole window after it is created or resized
+        self.text = None
+        self.stale = True
+        self.update()
 
-                    if next_line is not None and i == next_line:
-                        prefix += f"{GREEN}—▸{line_color}"  # Mark next line to execute
-                    else:
-                        prefix += "  "  # Mark next line to execute
+    def vscroll(self, num):
+        if self.top is not None:
+            self.top = max(1, self.top + num)
+            self.stale = True
+            self.update()
 
-                    break_point_prefix = self.compose_breakpoint_prefix(breakpoints[i].sequence_number,
-                                                                        length_breakpoints)
-                    prefix = f"{RESET}{break_point_prefix}{prefix}"
+    def get_location(self):
+        try:
+            sal = gdb.selected_frame().find_sal()
+        except gdb.error:
+            return None, None
 
-                    if breakpoints[i].conditional:
-                        suffix = f"\t{YELLOW}({breakpoints[i].get_condition()})"
+        if sal.symtab is None:
+            return None, None
 
-                    if breakpoints[i].hit_times > 0:
-                        times = breakpoints[i].get_hit_times()
-                        message = "(" + "hit " + str(times) + " time" + ("" if times == 1 else "s") + ")"
-                        suffix += f"\t{YELLOW}{message}"
+        return sal.symtab, sal.line
 
-                    cursor_position = self.len_no_ansi(f"{prefix}{i:4}: {lines[i - 1].rstrip()}")
-                    spaces = " " * cursor_position
+    def clip(self, row, width):
+        # Cuts row to width columns, expanding tabs as curses does and keeping every escape code
+        output = []
+        column = 0
 
-                    all_breakpoints_in_the_line = breakpoint_dict[i]
+        for index, piece in enumerate(self.ESCAPE_PATTERN.split(row)):
+            if index % 2:
+                output.append(piece)
+                continue
 
-                    for row in all_breakpoints_in_the_line:
-                        if row[-1] > 0:
-                            hit_times = "(" + "hit " + str(row[-1]) + " time" + ("" if row[-1] == 1 else "s") + ")"
-                        else:
-                            hit_times = ""
+            for character in piece:
+                advance = 8 - column % 8 if character == "\t" else 1
+                if column + advance > width:
+                    column = width
+                    break
+                output.append(" " * advance if character == "\t" else character)
+                column += advance
 
-                        maxlen = len(str(max(all_breakpoints_in_the_line, key=lambda x: len(str(x[0])))[0]))
-                        other_leading_spaces = self.repeated_space(maxlen - len(str(row[0])))
+        return "".join(output)
 
-                        message = "(" + RED + other_leading_spaces + RESET + str(row[0]) + RED + (
-                            '●' if row[1] else '○') + ('?' if row[2] else '') + YELLOW + (
-                                      ("  " + row[3]) if row[3] != "" else "") + ")\t" + hit_times
-                        message = f"{spaces}\t{YELLOW}{message}{RESET}"
-                        other_breakpoints_message += (message + "\n")
+    def update(self):
+        if not self.window.is_valid():
+            return
 
+        symtab, next_line = self.get_location()
+        if symtab is None:
+            self.show("No current source file.")
+            return
 
-                elif next_line is not None and i == next_line:
-                    prefix = f"{GREEN}{leading_spaces}  —▸"  # Mark next line to execute
-                else:
-                    prefix = f"{RESET}{leading_spaces}    "
+        path = symtab.fullname()
+        try:
+            source = self.command.read_source(path)
+        except OSError:
+            self.show(f"Cannot read {path}.")
+            return
 
-                if next_line is not None and i == next_line:
-                    jump_state = self.get_asm_jump_state(file_type, line)
-                    if jump_state is not None:
-                        if jump_state:
-                            jump_string = f"\t{YELLOW}(will jump)"
-                        else:
-                            jump_string = f"\t{YELLOW}(will not jump)"
+        filename = symtab.filename
+        file_type = filename.split('.')[-1]
+        height = max(self.window.height, 1)
+        color = gdb.parameter("style enabled") is not False
 
-                print(f"{prefix}{i:4}: {lines[i - 1].rstrip()}{suffix}{jump_string}{RESET}")
-                if other_breakpoints_message != "":
-                    print(other_breakpoints_message.rstrip())
+        # A new location is followed when it is outside the window; scrolling holds until then
+        location = (path, next_line)
+        if location != self.location:
+            if self.location is None or path != self.location[0] or not self.top <= next_line < self.top + height:
+                self.top = max(1, next_line - height // 3)
+            self.location = location
+            self.stale = True
 
+        if not self.stale:
+            return
+        self.stale = False
+
+        view = (path, source.mtime, source.size, self.command.breakpoint_index.max_digits(path),
+                self.window.width, color, color and self.command.highlighter.enabled())
+        if view != self.view:
+            self.view = view
+            self.rows.clear()
+
+        self.window.title = filename
+
+        bottom = source.clamp_line(self.top + height - 1)
+        lines = self.command.read_lines(source, self.top, bottom)
+        breakpoints, breakpoint_dict = self.command.get_breakpoints(path, self.top, bottom)
+        moved = self.command.breakpoint_index.query_moved(path, self.top, bottom)
+        executable = self.command.line_tables.get_executable(symtab, self.top, bottom)
+
+        rows = {}
+        output = []
+        for i in range(self.top, bottom + 1):
+            breakpoint = breakpoints.get(i)
+            signature = (i == next_line,
+                         (breakpoint.sequence_number, breakpoint.active, breakpoint.conditional,
+                          breakpoint.condition, breakpoint.hit_times) if breakpoint is not None else None,
+                         tuple(tuple(row) for row in breakpoint_dict.get(i, ())),
+                         tuple(state.sequence_number for state in moved.get(i, ())),
+                         executable.placement(i) if executable is not None else None,
+                         self.command.get_asm_jump_state(file_type, lines[i - self.top]))
+
+            row = self.rows.get(i)
+            if row is None or row[0] != signature:
+                # Only this line is rendered again
+                rendered = self.command.render_window(filename, file_type, source, i, i, next_line, color,
+                                                      executable=executable)
+                row = (signature, [self.clip(text, self.window.width) for text in rendered.split("\n")])
+            rows[i] = row
+            output.extend(row[1])
+
+            if len(output) >= height:
+                break
+
+        self.rows = rows
+        self.show("\n".join(output[:height]))
+
+    def show(self, text):
+        if text == self.text:
+            return
+        self.text = text
 
-        except Exception as e:
-            print(f"Error: {e}")
+        try:
+            # Replaces the contents in one go, gdb 14 and later
+            self.window.write(text, True)
+        except TypeError:
+            self.window.erase()
+            self.window.write(text)
 
 
 # Register the new list command
-EnhancedListCommand()
+list_command = EnhancedListCommand()
+ListStatsCommand(list_command.stats)
+ListProfileCommand(list_command.profiler)
+ListAutoCommand(AutoLister(list_command))
+
+# The List window for TUI layouts, in gdb 10 and later
+if hasattr(gdb, "register_window_type"):
+    gdb.register_window_type("List", lambda window: ListWindow(window, list_command))
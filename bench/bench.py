@@ -0,0 +1,463 @@
+"""
+Times List.py outside of gdb, against the stand-in gdb module next to this file.
+
+    python bench/bench.py [--iterations N] [--scenario NAME ...]
+
+Every scenario is run twice: once for latency, and once more for a few iterations under
+tracemalloc for the peak memory, so the tracing does not inflate the timings.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gdb  # noqa: E402  the stand-in in this directory
+import List  # noqa: E402
+
+scenarios = {}
+
+
+def scenario(function):
+    scenarios[function.__name__.replace("_", "-")] = function
+    return function
+
+
+def write_c_source(path, total_lines):
+    if os.path.exists(path):
+        return
+
+    with open(path, "w") as source_file:
+        source_file.write("#include <stdio.h>\n\nint main(void)\n{\n")
+        for i in range(5, total_lines):
+            source_file.write(f"    value = value * {i} + table[{i % 97}].field; /* generated */\n")
+        source_file.write("}\n")
+
+
+def write_asm_source(path, total_lines):
+    if os.path.exists(path):
+        return
+
+    opcodes = ["cmp eax, ebx", "jne again", "je start", "loop again", "jg again", "mov ecx, 5", "jrcxz done"]
+    with open(path, "w") as source_file:
+        source_file.write("section .text\nstart:\nagain:\n")
+        for i in range(3, total_lines):
+            source_file.write(f"    {opcodes[i % len(opcodes)]}\n")
+
+
+def make_breakpoints(filename, total_lines, count, rng):
+    """
+    A mix of plain, disabled, conditional and <MULTIPLE> breakpoints, several of them on the same line.
+    """
+
+    breakpoints = []
+    for number in range(1, count + 1):
+        line = rng.randint(1, total_lines)
+        locations = [gdb.BreakpointLocation(filename, line)]
+        if number % 7 == 0:
+            locations.append(gdb.BreakpointLocation(filename, rng.randint(1, total_lines), enabled=number % 2 == 0))
+
+        conditional = number % 3 == 0
+        breakpoints.append(gdb.Breakpoint(number, locations, enabled=number % 5 != 0,
+                                          condition=f"i > {number}" if conditional else None,
+                                          hit_count=rng.randint(0, 3) if conditional else rng.randint(0, 1)))
+
+    return breakpoints
+
+
+def new_session(path, filename, line, breakpoints=(), architecture="i386:x86-64", registers=None, sal_pc=0,
+                line_table=(), cache_dir=""):
+    # No on-disk index cache unless the scenario is about it
+    os.environ["GDB_LIST_CACHE_DIR"] = cache_dir
+    gdb.reset()
+    symtab = gdb.Symtab(filename, path, line_table=line_table)
+    gdb.all_breakpoints.extend(breakpoints)
+    gdb.set_frames(gdb.Frame(gdb.Symtab_and_line(symtab, line, sal_pc), registers, architecture))
+    return List.EnhancedListCommand(), symtab
+
+
+def stop():
+    gdb.events.stop.fire(None)
+
+
+@scenario
+def list_small(workdir, rng):
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, _ = new_session(path, "small.c", 100, make_breakpoints("small.c", 200, 20, rng))
+
+    def step(i):
+        stop()
+        command.invoke("", False)
+
+    return step
+
+
+@scenario
+def list_small_repeat(workdir, rng):
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, _ = new_session(path, "small.c", 100, make_breakpoints("small.c", 200, 20, rng))
+
+    def step(i):
+        command.invoke("95,104", False)
+
+    return step
+
+
+@scenario
+def list_10k_breakpoints(workdir, rng):
+    path = os.path.join(workdir, "many.c")
+    write_c_source(path, 50000)
+    command, _ = new_session(path, "many.c", 25000, make_breakpoints("many.c", 50000, 10000, rng))
+
+    def step(i):
+        stop()
+        first = rng.randint(1, 49990)
+        command.invoke(f"{first},{first + 9}", False)
+
+    return step
+
+
+@scenario
+def get_breakpoints_rebuild(workdir, rng):
+    path = os.path.join(workdir, "many.c")
+    write_c_source(path, 50000)
+    breakpoints = make_breakpoints("many.c", 50000, 10000, rng)
+    command, _ = new_session(path, "many.c", 25000, breakpoints)
+
+    def step(i):
+        breakpoint = breakpoints[i % len(breakpoints)]
+        breakpoint.hit_count += 1
+        gdb.events.breakpoint_modified.fire(breakpoint)
+        first = rng.randint(1, 49990)
+        command.get_breakpoints("many.c", first, first + 9)
+
+    return step
+
+
+@scenario
+def list_1m_lines_cold(workdir, rng):
+    path = os.path.join(workdir, "huge.c")
+    write_c_source(path, 1000000)
+    command, _ = new_session(path, "huge.c", 999990)
+
+    def step(i):
+        command.source_cache.clear()
+        stop()
+        command.invoke("", False)
+
+    return step
+
+
+@scenario
+def list_1m_lines_new_session(workdir, rng):
+    # A fresh gdb session every time, finding the indexes of the earlier ones on disk
+    path = os.path.join(workdir, "huge.c")
+    write_c_source(path, 1000000)
+    cache_dir = os.path.join(workdir, "index-cache")
+
+    def step(i):
+        command, _ = new_session(path, "huge.c", 999990, cache_dir=cache_dir)
+        stop()
+        command.invoke("", False)
+
+    return step
+
+
+@scenario
+def list_1m_lines_warm(workdir, rng):
+    path = os.path.join(workdir, "huge.c")
+    write_c_source(path, 1000000)
+    command, _ = new_session(path, "huge.c", 500000, make_breakpoints("huge.c", 1000000, 1000, rng))
+
+    def step(i):
+        stop()
+        first = rng.randint(1, 999990)
+        command.invoke(f"{first},{first + 9}", False)
+
+    return step
+
+
+@scenario
+def getscope(workdir, rng):
+    path = os.path.join(workdir, "scope.c")
+    write_c_source(path, 2000)
+    command, symtab = new_session(path, "scope.c", 1000)
+    gdb.functions["main"] = [(symtab, 3)]
+    arguments = ["", "", "-", "500", "500,520", "600,", ",700", "main", "scope.c:1500", "."]
+
+    def step(i):
+        command.getscope(arguments[i % len(arguments)])
+
+    return step
+
+
+@scenario
+def list_values(workdir, rng):
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, _ = new_session(path, "small.c", 100)
+    gdb.variables.update({"value": 42, "table[7].field": 3, "table[8].field": 4})
+
+    def step(i):
+        stop()
+        command.invoke("--values", False)
+
+    return step
+
+
+@scenario
+def list_asm(workdir, rng):
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    line_table = [(line, 0x1000 + (line - 5) * 12) for line in range(5, 200)] + [(0, 0x1000 + 195 * 12)]
+    command, symtab = new_session(path, "small.c", 100, sal_pc=0x1000 + 95 * 12, line_table=line_table)
+    for address in range(0x1000, 0x1000 + 195 * 12, 4):
+        gdb.instructions[address] = (4, ["mov    %eax,%ebx", "cmp    $0x5,%eax", "jne    0x1000 <main>"][address % 3])
+    gdb.blocks.append((0x1000, 0x1000 + 195 * 12, "main"))
+
+    def step(i):
+        stop()
+        command.invoke("--asm", False)
+
+    return step
+
+
+@scenario
+def list_threads(workdir, rng):
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, symtab = new_session(path, "small.c", 100)
+    for number in range(1, 501):
+        line = 100 + rng.randint(-8, 8) if number % 4 else 150
+        gdb.threads.append(gdb.InferiorThread(number, [gdb.Frame(gdb.Symtab_and_line(symtab, line))]))
+    gdb.threads[0].switch()
+
+    def step(i):
+        stop()
+        command.invoke("--threads", False)
+
+    return step
+
+
+@scenario
+def tui_step(workdir, rng):
+    # Stepping through a loop with the List TUI window open and breakpoints in view
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, symtab = new_session(path, "small.c", 100, make_breakpoints("small.c", 200, 20, rng))
+    window = List.ListWindow(gdb.TuiWindow(), command)
+    window.render()
+
+    def step(i):
+        gdb.set_frames(gdb.Frame(gdb.Symtab_and_line(symtab, 90 + i % 20)))
+        stop()
+        gdb.events.before_prompt.fire()
+
+    return step
+
+
+@scenario
+def profile_sample(workdir, rng):
+    # One sampling stop of 100 threads spread over 50 hot PCs
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, symtab = new_session(path, "small.c", 100)
+    for pc in range(0x1000, 0x1000 + 50 * 4, 4):
+        gdb.pc_lines[pc] = gdb.Symtab_and_line(symtab, 80 + (pc - 0x1000) // 8, pc)
+    for number in range(1, 101):
+        pc = 0x1000 + rng.randrange(50) * 4
+        gdb.threads.append(gdb.InferiorThread(number, [gdb.Frame(gdb.Symtab_and_line(symtab, 0, pc))]))
+    gdb.threads[0].switch()
+
+    def step(i):
+        command.profiler.pending = True
+        command.profiler.on_stop(gdb.SignalEvent("SIGINT"))
+        gdb.posted.clear()
+
+    return step
+
+
+@scenario
+def list_heat(workdir, rng):
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, _ = new_session(path, "small.c", 100)
+    for _ in range(10000):
+        command.profiler.count((path, int(rng.gauss(100, 5))))
+    command.profiler.samples = 10000
+
+    def step(i):
+        stop()
+        command.invoke("--heat", False)
+
+    return step
+
+
+@scenario
+def list_executable(workdir, rng):
+    # Random windows of a file whose line table has 100k entries
+    path = os.path.join(workdir, "code.c")
+    write_c_source(path, 200000)
+    line_table = [(line, 0x1000 + line * 8) for line in range(5, 200000, 2)] + [(0, 0x1000 + 200000 * 8)]
+    command, _ = new_session(path, "code.c", 100000, line_table=line_table)
+
+    def step(i):
+        stop()
+        first = rng.randint(1, 199990)
+        command.invoke(f"{first},{first + 9}", False)
+
+    return step
+
+
+@scenario
+def auto_step_burst(workdir, rng):
+    # A scripted `next` loop with List-auto on: one listing per interval, the other stops skipped
+    path = os.path.join(workdir, "small.c")
+    write_c_source(path, 200)
+    command, symtab = new_session(path, "small.c", 100, make_breakpoints("small.c", 200, 20, rng))
+    auto_lister = List.AutoLister(command)
+    auto_lister.enable(set())
+
+    def step(i):
+        gdb.set_frames(gdb.Frame(gdb.Symtab_and_line(symtab, 50 + i % 100)))
+        stop()
+
+    return step
+
+
+@scenario
+def list_json_bulk(workdir, rng):
+    # Three 20k-line ranges of a large file exported in one invocation
+    path = os.path.join(workdir, "huge.c")
+    write_c_source(path, 1000000)
+    command, _ = new_session(path, "huge.c", 500000, make_breakpoints("huge.c", 1000000, 1000, rng))
+
+    def step(i):
+        first = rng.randint(1, 900000)
+        command.invoke(f"--json {first},{first + 19999}; {first + 40000},{first + 59999}; "
+                       f"{first + 80000},{first + 99999}", False)
+
+    return step
+
+
+def write_source_tree(directory, files):
+    # Many small C files, each with a few distinctive names
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(files):
+        path = os.path.join(directory, f"module{number}.c")
+        paths.append(path)
+        if not os.path.exists(path):
+            with open(path, "w") as source_file:
+                for line in range(1, 400):
+                    source_file.write(f"    total_{number}_{line % 37} += buffer[{line}] * factor_{line % 11};\n")
+    return paths
+
+
+@scenario
+def search(workdir, rng):
+    # List /pattern over 500 files: the first call indexes them, the later ones only check mtimes
+    paths = write_source_tree(os.path.join(workdir, "tree"), 500)
+    command, _ = new_session(paths[0], "module0.c", 100)
+    gdb.outputs["info sources"] = "/a.out:\n\n" + ", ".join(paths) + "\n"
+
+    def step(i):
+        command.invoke(f"/total_{rng.randrange(500)}_3 += buffer", False)
+
+    return step
+
+
+@scenario
+def list_backtrace(workdir, rng):
+    # A 24-frame stack over 4 files with breakpoints in them, listed with one List --bt
+    paths = write_source_tree(os.path.join(workdir, "tree"), 4)
+    symtabs = [gdb.Symtab(os.path.basename(path), path) for path in paths]
+    breakpoints = [breakpoint for symtab in symtabs
+                   for breakpoint in make_breakpoints(symtab.filename, 399, 10, rng)]
+    for number, breakpoint in enumerate(breakpoints, 1):
+        breakpoint.number = number
+    command, _ = new_session(paths[0], symtabs[0].filename, 100, breakpoints)
+    for symtab in symtabs:
+        gdb.symtabs[symtab.filename] = symtab
+    gdb.set_frames(*(gdb.Frame(gdb.Symtab_and_line(symtabs[level % 4], 10 + level * 15), name=f"function{level}")
+                     for level in range(24)))
+
+    def step(i):
+        stop()
+        command.invoke("--bt", False)
+
+    return step
+
+
+@scenario
+def get_flags(workdir, rng):
+    path = os.path.join(workdir, "loop.asm")
+    write_asm_source(path, 2000)
+    command, _ = new_session(path, "loop.asm", 1000, registers={"eflags": 0x246, "rcx": 3, "ecx": 3})
+
+    def step(i):
+        gdb.events.cont.fire(None)
+        stop()
+        command.invoke("990,1009", False)
+
+    return step
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(name, iterations, workdir):
+    function = scenarios[name]
+
+    step = function(workdir, random.Random(1))
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        step(i)
+        samples.append(time.perf_counter() - start)
+        gdb.output.clear()
+    samples.sort()
+
+    # The same scenario again, set up from scratch, for the peak memory
+    tracemalloc.start()
+    step = function(workdir, random.Random(1))
+    for i in range(min(iterations, 5)):
+        step(i)
+        gdb.output.clear()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return samples, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios),
+                        help="run only this scenario (repeatable)")
+    arguments = parser.parse_args()
+
+    print(f"{'scenario':<26}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'peak KiB':>12}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in arguments.scenario or scenarios:
+            samples, peak = run(name, arguments.iterations, workdir)
+            print(f"{name:<26}"
+                  f"{percentile(samples, 0.5) * 1000:>10.3f}"
+                  f"{percentile(samples, 0.9) * 1000:>10.3f}"
+                  f"{percentile(samples, 0.99) * 1000:>10.3f}"
+                  f"{samples[-1] * 1000:>10.3f}"
+                  f"{peak / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+"""
+A stand-in for the `gdb` module, so List.py can be imported and timed outside of gdb.
+
+Only what List.py uses is provided. The state it reads (breakpoints, frames, symtabs,
+registers, parameters and the text returned by execute) is plain module data that a
+benchmark scenario sets up, and reset() puts back to an empty session.
+"""
+
+COMMAND_NONE = -1
+COMMAND_RUNNING = 0
+COMMAND_DATA = 1
+COMMAND_STACK = 2
+COMMAND_FILES = 3
+COMMAND_SUPPORT = 4
+COMMAND_STATUS = 5
+COMMAND_BREAKPOINTS = 6
+COMMAND_TRACEPOINTS = 7
+COMMAND_OBSCURE = 8
+COMMAND_MAINTENANCE = 9
+COMMAND_USER = 13
+
+PARAM_BOOLEAN = 0
+PARAM_AUTO_BOOLEAN = 1
+PARAM_UINTEGER = 2
+PARAM_INTEGER = 3
+PARAM_STRING = 4
+PARAM_FILENAME = 6
+PARAM_ZINTEGER = 9
+PARAM_ZUINTEGER = 10
+PARAM_ZUINTEGER_UNLIMITED = 11
+PARAM_ENUM = 12
+
+BP_BREAKPOINT = 1
+
+
+class error(RuntimeError):
+    pass
+
+
+class GdbError(Exception):
+    pass
+
+
+class MemoryError(error):
+    pass
+
+
+class EventRegistry:
+    def __init__(self):
+        self.handlers = []
+
+    def connect(self, handler):
+        self.handlers.append(handler)
+
+    def disconnect(self, handler):
+        self.handlers.remove(handler)
+
+    def fire(self, event=None):
+        for handler in list(self.handlers):
+            handler(event)
+
+
+class events:
+    pass
+
+
+class StopEvent:
+    pass
+
+
+class SignalEvent(StopEvent):
+    def __init__(self, stop_signal):
+        self.stop_signal = stop_signal
+
+
+class BreakpointEvent(StopEvent):
+    def __init__(self, breakpoints):
+        self.breakpoints = breakpoints
+        self.breakpoint = breakpoints[0]
+
+
+EVENT_NAMES = ("stop", "cont", "exited", "new_objfile", "clear_objfiles", "new_inferior", "new_thread",
+               "inferior_call", "memory_changed", "register_changed", "breakpoint_created",
+               "breakpoint_modified", "breakpoint_deleted", "before_prompt")
+
+STDOUT, STDERR, STDLOG = 0, 1, 2
+
+commands = {}
+executed = []
+outputs = {}
+parameters = {}
+output = []
+errors = []  # what was written to STDERR
+posted = []
+frames = []
+selected = None
+all_breakpoints = []
+functions = {}
+symtabs = {}
+instructions = {}  # address -> (length, text)
+blocks = []  # (start, end, function name)
+threads = []
+current_thread = None
+window_types = {}
+pc_lines = {}  # pc -> Symtab_and_line, for find_pc_line
+default_location = None
+
+
+def reset():
+    """
+    Forgets every command, breakpoint, frame and event handler.
+    """
+
+    global selected, default_location, current_thread
+
+    for name in EVENT_NAMES:
+        setattr(events, name, EventRegistry())
+
+    commands.clear()
+    executed.clear()
+    outputs.clear()
+    output.clear()
+    errors.clear()
+    posted.clear()
+    frames.clear()
+    all_breakpoints.clear()
+    functions.clear()
+    symtabs.clear()
+    instructions.clear()
+    blocks.clear()
+    threads.clear()
+    window_types.clear()
+    pc_lines.clear()
+    variables.clear()
+    selected = None
+    current_thread = None
+    default_location = None
+
+    parameters.clear()
+    parameters.update({"listsize": 10, "height": 0, "width": 0, "pagination": False, "style enabled": True})
+
+
+class Command:
+    def __init__(self, name, command_class, completer_class=-1, prefix=False):
+        commands[name] = self
+
+    def dont_repeat(self):
+        pass
+
+
+class Parameter:
+    def __init__(self, name, command_class, parameter_class, *enum_sequence):
+        self.name = name
+        self.value = None
+        parameters[name] = self
+
+
+def parameter(name):
+    value = parameters.get(name)
+    return value.value if isinstance(value, Parameter) else value
+
+
+def execute(command, from_tty=False, to_string=False):
+    """
+    Looks the command up in `outputs`, by the whole command or by its first word.
+    A value in `outputs` may be a string or a function of the command.
+    """
+
+    executed.append(command)
+    result = outputs.get(command, outputs.get(command.split(" ", 1)[0], ""))
+    if callable(result):
+        result = result(command)
+
+    if to_string:
+        return result
+
+    if result:
+        write(result)
+
+
+def write(string, stream=None):
+    if stream == STDERR:
+        errors.append(string)
+    else:
+        output.append(string)
+
+
+def flush(stream=None):
+    pass
+
+
+def post_event(event):
+    posted.append(event)
+
+
+def run_posted_events():
+    while posted:
+        posted.pop(0)()
+
+
+class Objfile:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def is_valid(self):
+        return True
+
+
+class LineTableEntry:
+    def __init__(self, line, pc):
+        self.line = line
+        self.pc = pc
+
+
+class LineTable:
+    def __init__(self, entries):
+        self.entries = [LineTableEntry(line, pc) for line, pc in entries]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def line(self, line):
+        found = tuple(entry for entry in self.entries if entry.line == line)
+        return found or None
+
+    def has_line(self, line):
+        return any(entry.line == line for entry in self.entries)
+
+    def source_lines(self):
+        return sorted({entry.line for entry in self.entries})
+
+
+class Symtab:
+    def __init__(self, filename, fullname, objfile=None, line_table=()):
+        self.filename = filename
+        self.objfile = objfile or Objfile("a.out")
+        self._fullname = fullname
+        self._line_table = LineTable(line_table)
+        symtabs[filename] = self
+
+    def fullname(self):
+        return self._fullname
+
+    def is_valid(self):
+        return True
+
+    def linetable(self):
+        return self._line_table
+
+
+class Symtab_and_line:
+    def __init__(self, symtab, line, pc=0):
+        self.symtab = symtab
+        self.line = line
+        self.pc = pc
+        self.last = None
+
+    def is_valid(self):
+        return True
+
+
+class Architecture:
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    def disassemble(self, start_pc, end_pc=None, count=None):
+        """
+        The instructions in `instructions` from start_pc up to and including end_pc.
+        """
+
+        found = []
+        for address in sorted(instructions):
+            if address >= start_pc and (end_pc is None or address <= end_pc):
+                length, text = instructions[address]
+                found.append({"addr": address, "asm": text, "length": length})
+        return found[:count] if count is not None else found
+
+
+class Block:
+    def __init__(self, start, end, function=None, superblock=None):
+        self.start = start
+        self.end = end
+        self.function = function
+        self.superblock = superblock
+
+
+def block_for_pc(pc):
+    for start, end, function in blocks:
+        if start <= pc < end:
+            return Block(start, end, function)
+    return None
+
+
+class Frame:
+    def __init__(self, sal, registers=None, architecture="i386:x86-64", name="main", level=0):
+        self.sal = sal
+        self.registers = registers or {"eflags": 0x246, "rcx": 0, "ecx": 0}
+        self._architecture = Architecture(architecture)
+        self._name = name
+        self._level = level
+
+    def find_sal(self):
+        return self.sal
+
+    def read_register(self, name):
+        if name not in self.registers:
+            raise ValueError(f"Bad register: {name}")
+        return self.registers[name]
+
+    def architecture(self):
+        return self._architecture
+
+    def pc(self):
+        return self.sal.pc
+
+    def name(self):
+        return self._name
+
+    def level(self):
+        return self._level
+
+    def is_valid(self):
+        return True
+
+    def older(self):
+        return frames[self._level + 1] if self._level + 1 < len(frames) else None
+
+    def newer(self):
+        return frames[self._level - 1] if self._level > 0 else None
+
+    def select(self):
+        global selected
+        selected = self
+
+
+class TuiWindow:
+    """
+    Counts what is written to it instead of drawing.
+    """
+
+    def __init__(self, width=120, height=40):
+        self.width = width
+        self.height = height
+        self.title = ""
+        self.text = ""
+        self.writes = 0
+
+    def is_valid(self):
+        return True
+
+    def erase(self):
+        self.text = ""
+
+    def write(self, string, full_window=False):
+        self.text = string if full_window else self.text + string
+        self.writes += 1
+
+
+def register_window_type(name, factory):
+    window_types[name] = factory
+
+
+def find_pc_line(pc):
+    return pc_lines.get(pc) or Symtab_and_line(None, 0, pc)
+
+
+def selected_frame():
+    if selected is None:
+        raise error("No frame selected.")
+    return selected
+
+
+def newest_frame():
+    if not frames:
+        raise error("No stack.")
+    return frames[0]
+
+
+class InferiorThread:
+    def __init__(self, num, stack):
+        self.num = num
+        self.stack = stack
+
+    def is_valid(self):
+        return True
+
+    def is_stopped(self):
+        return True
+
+    def is_running(self):
+        return False
+
+    def switch(self):
+        global current_thread
+        current_thread = self
+        set_frames(*self.stack)
+
+
+class Inferior:
+    def threads(self):
+        return tuple(reversed(threads))
+
+    def architecture(self):
+        return Architecture("i386:x86-64")
+
+
+def selected_inferior():
+    return Inferior()
+
+
+def selected_thread():
+    return current_thread
+
+
+def set_frames(*stack):
+    """
+    Replaces the call stack with `stack`, innermost frame first, and selects the innermost frame.
+    """
+
+    global selected
+
+    frames[:] = stack
+    for level, frame in enumerate(frames):
+        frame._level = level
+    selected = frames[0] if frames else None
+
+
+class BreakpointLocation:
+    def __init__(self, filename, line, enabled=True, fullname=None, address=0):
+        self.source = (filename, line)
+        self.enabled = enabled
+        self._fullname = fullname
+        self.address = address
+
+    @property
+    def fullname(self):
+        # The full path of the symtab, once one is known for filename
+        if self._fullname is None and self.source[0] in symtabs:
+            return symtabs[self.source[0]].fullname()
+        return self._fullname
+
+
+class Breakpoint:
+    def __init__(self, number, locations, enabled=True, condition=None, hit_count=0, temporary=False,
+                 location="", type=BP_BREAKPOINT):
+        self.number = number
+        self.locations = locations
+        self.enabled = enabled
+        self.condition = condition
+        self.hit_count = hit_count
+        self.temporary = temporary
+        if not location and locations:
+            location = f"{locations[0].source[0]}:{locations[0].source[1]}"
+        self.location = location
+        self.type = type
+        self.visible = True
+
+    def is_valid(self):
+        return True
+
+
+def breakpoints():
+    return tuple(all_breakpoints)
+
+
+def decode_line(argument=None):
+    """
+    Knows line numbers, `file:line` and the names in `functions` (name -> list of (symtab, line)).
+    """
+
+    if argument is None:
+        if selected is not None:
+            return None, (selected.find_sal(),)
+        if default_location is None:
+            raise error("No symbol table is loaded.  Use the \"file\" command.")
+        return None, (Symtab_and_line(*default_location),)
+
+    if argument in functions:
+        return None, tuple(Symtab_and_line(symtab, line) for symtab, line in functions[argument])
+
+    filename, _, line = argument.rpartition(":")
+    if filename in symtabs and line.isdigit():
+        return None, (Symtab_and_line(symtabs[filename], int(line)),)
+
+    raise error(f"Function \"{argument}\" not defined.")
+
+
+class Value:
+    def __init__(self, value):
+        self.value = value
+
+    def format_string(self, **options):
+        return str(self.value)
+
+    def __str__(self):
+        return str(self.value)
+
+    def __int__(self):
+        return int(self.value)
+
+
+variables = {}
+
+
+def parse_and_eval(expression):
+    """
+    Looks the expression up in `variables`.
+    """
+
+    if expression not in variables:
+        raise error(f"No symbol \"{expression}\" in current context.")
+    return Value(variables[expression])
+
+
+reset()
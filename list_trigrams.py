@@ -0,0 +1,30 @@
+# The trigram indexing of List /pattern. It does not need gdb, so that SourceSearch's worker
+# processes, which start afresh rather than as forks of gdb, can import it. Install it next to List.py.
+
+import os
+
+BITS = 1 << 16
+
+
+def get_bitmap(data):
+    bitmap = bytearray(BITS // 8)
+    for first, second, third in set(zip(data, data[1:], data[2:])):
+        bit = (first * 961 + second * 31 + third) % BITS
+        bitmap[bit >> 3] |= 1 << (bit & 7)
+    return bytes(bitmap)
+
+
+def index_trigrams(path):
+    """
+    Returns (path, size, mtime, bitmap) where bitmap has a bit set for every trigram hash in the
+    file, or None when it cannot be read. Runs in SourceSearch's process pool.
+    """
+
+    try:
+        stat = os.stat(path)
+        with open(path, "rb") as source_file:
+            data = source_file.read()
+    except OSError:
+        return None
+
+    return path, stat.st_size, stat.st_mtime_ns, get_bitmap(data)
@@ -0,0 +1,23 @@
+"""
+Runs List.py against the stand-in gdb module in bench/, as bench/bench.py does.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+sys.path.insert(1, ROOT)
+
+import gdb  # noqa: E402  the stand-in in bench/
+
+
+@pytest.fixture(autouse=True)
+def session(monkeypatch):
+    # No on-disk index cache, and an empty gdb session for every test
+    monkeypatch.setenv("GDB_LIST_CACHE_DIR", "")
+    gdb.reset()
+    yield
+    gdb.reset()
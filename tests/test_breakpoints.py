@@ -0,0 +1,60 @@
+import random
+
+import gdb
+import List
+
+
+def snapshot(index, filename):
+    entry = index.get_entry(filename)
+
+    def key(state):
+        return state.sequence_number, state.line_number, state.active, state.conditional, state.hit_times
+
+    return (list(entry.lines), {line: key(state) for line, state in entry.breakpoints.items()}, entry.others,
+            {line: [key(state) for state in states] for line, states in entry.moved.items()}, entry.digits)
+
+
+def test_modified_breakpoints_update_their_lines_like_a_rebuild():
+    rng = random.Random(1)
+    breakpoints = []
+    for number in (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144):
+        locations = [gdb.BreakpointLocation("main.c", rng.randint(1, 6))]
+        if number % 5 == 0:
+            locations.append(gdb.BreakpointLocation("main.c", rng.randint(1, 6), enabled=False))
+        breakpoints.append(gdb.Breakpoint(number, locations, location=f"main.c:{rng.randint(1, 6)}"))
+    gdb.all_breakpoints.extend(breakpoints)
+
+    index = List.BreakpointIndex()
+    index.get_entry("main.c")
+
+    for _ in range(300):
+        breakpoint = rng.choice(breakpoints)
+        change = rng.randrange(5)
+        if change == 0:
+            breakpoint.hit_count += 1
+        elif change == 1:
+            breakpoint.enabled = not breakpoint.enabled
+        elif change == 2:
+            breakpoint.condition = None if breakpoint.condition else "x > 1"
+        elif change == 3:
+            breakpoint.locations = [gdb.BreakpointLocation("main.c", rng.randint(1, 6))]
+        else:
+            breakpoint.locations = []  # pending again
+        gdb.events.breakpoint_modified.fire(breakpoint)
+
+        assert not index.files["main.c"].dirty
+        incremental = snapshot(index, "main.c")
+        index.files["main.c"].dirty = True
+        assert snapshot(index, "main.c") == incremental
+
+
+def test_a_header_reached_under_two_names_keeps_its_breakpoints(tmp_path):
+    path = tmp_path / "foo.h"
+    path.write_text("".join(f"int foo_{i};\n" for i in range(1, 11)))
+    gdb.Symtab("foo.h", str(path))
+    gdb.all_breakpoints.append(gdb.Breakpoint(1, [gdb.BreakpointLocation("../inc/foo.h", 4, fullname=str(path))]))
+    command = List.EnhancedListCommand()
+
+    output = command.render_window("foo.h", "h", command.read_source(str(path)), 1, 10, None, False)
+
+    assert "1● " in output.split("\n")[3]
@@ -0,0 +1,95 @@
+import json
+
+import gdb
+import List
+import pytest
+
+
+def make_command(tmp_path, line=50):
+    path = tmp_path / "main.c"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 101)))
+    symtab = gdb.Symtab("main.c", str(path))
+    gdb.functions["helper"] = [(symtab, 80)]
+    gdb.set_frames(gdb.Frame(gdb.Symtab_and_line(symtab, line)))
+    return List.EnhancedListCommand()
+
+
+def lines(command, argument):
+    _, first, last = command.getscope(argument)
+    return first, last
+
+
+def test_lines_functions_and_ranges(tmp_path):
+    command = make_command(tmp_path)
+
+    assert lines(command, "") == (45, 54)
+    assert lines(command, "20") == (15, 24)
+    assert lines(command, "20,30") == (20, 30)
+    assert lines(command, "20,") == (20, 29)
+    assert lines(command, ",30") == (21, 30)
+    assert lines(command, "helper") == (75, 84)
+    assert lines(command, "main.c:10") == (5, 14)
+    assert lines(command, "95,200") == (95, 100)
+
+
+def test_continuation(tmp_path):
+    command = make_command(tmp_path)
+
+    assert lines(command, "") == (45, 54)
+    assert lines(command, "") == (55, 64)
+    assert lines(command, "+") == (65, 74)
+    assert lines(command, "-") == (55, 64)
+    assert lines(command, "-") == (45, 54)
+
+
+def test_continuation_restarts_after_a_stop(tmp_path):
+    command = make_command(tmp_path)
+
+    assert lines(command, "") == (45, 54)
+    gdb.events.stop.fire(gdb.SignalEvent("SIGTRAP"))
+    assert lines(command, "") == (45, 54)
+
+
+def test_offsets_count_from_the_last_line_listed(tmp_path):
+    command = make_command(tmp_path)
+
+    assert lines(command, "+5") == (50, 59)
+    assert lines(command, "20,29") == (20, 29)
+    assert lines(command, "+10") == (34, 43)
+    assert lines(command, "-10") == (28, 37)
+    assert lines(command, "60,+5") == (60, 65)
+
+
+def test_unlimited_listsize_lists_the_whole_file(tmp_path):
+    command = make_command(tmp_path)
+    gdb.parameters["listsize"] = None
+
+    assert lines(command, "") == (1, 100)
+    assert lines(command, "30,") == (30, 100)
+
+
+def test_a_backwards_range_is_an_error(tmp_path, capsys):
+    command = make_command(tmp_path)
+
+    assert lines(command, "30,20") == (None, None)
+    assert "Error: Second line 20 is before the first line 30." in capsys.readouterr().out
+
+
+def test_a_bad_range_in_json_output_is_reported_on_standard_error(tmp_path, capsys):
+    command = make_command(tmp_path)
+
+    command.export_json("20,21;30,20;40,40")
+
+    records = [json.loads(line) for line in "".join(gdb.output).splitlines()]
+    assert [record["line"] for record in records] == [20, 21, 40]
+    assert gdb.errors == ["Error: Second line 20 is before the first line 30.\n"]
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize("count", ["0", "-1", "two"])
+def test_backtrace_listings_need_a_positive_count(tmp_path, count):
+    command = make_command(tmp_path)
+
+    with pytest.raises(gdb.GdbError, match=r"Usage: List --bt \[N\]"):
+        command.invoke(f"--bt {count}", False)
+    assert gdb.output == []
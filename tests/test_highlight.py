@@ -0,0 +1,44 @@
+import gdb
+import List
+
+
+def make_command(tmp_path, text, line):
+    path = tmp_path / "main.c"
+    path.write_text(text)
+    symtab = gdb.Symtab("main.c", str(path))
+    gdb.set_frames(gdb.Frame(gdb.Symtab_and_line(symtab, line)))
+    return List.EnhancedListCommand()
+
+
+def test_style_sources_off_is_not_served_from_the_render_cache(tmp_path):
+    command = make_command(tmp_path, "".join(f"int line_{i};\n" for i in range(1, 41)), 20)
+
+    command.invoke("", False)
+    command.invoke("15,24", False)
+    assert List.SyntaxHighlighter.TYPE in gdb.output[-1]
+
+    gdb.parameters["style sources"] = False
+    command.invoke("15,24", False)
+    assert List.SyntaxHighlighter.TYPE not in gdb.output[-1]
+
+
+def test_a_cold_listing_far_into_a_file_scans_a_bounded_distance(tmp_path):
+    lines = [f"int line_{i};\n" for i in range(1, 100001)]
+    lines[89994] = "/* a comment\n"
+    lines[90004] = "   closed */ int after;\n"
+    command = make_command(tmp_path, "".join(lines), 90000)
+    highlighter = command.highlighter
+    source = command.read_source(str(tmp_path / "main.c"))
+
+    highlighted = highlighter.highlight(source, "c", command.read_lines(source, 90000, 90009), 90000)
+
+    assert highlighted[0] == f"{highlighter.COMMENT}int line_90000;{highlighter.RESET}"
+    assert highlighted[5].startswith(f"{highlighter.COMMENT}   closed */{highlighter.RESET}")
+    tokens = highlighter.files[source.path]
+    assert len(tokens.states) == 1
+    assert not tokens.lines
+
+    # Once the checkpoints are there, as the prefetcher computes them, the state is known
+    highlighter.extend_states(tokens.states, source, 100000 // highlighter.CHECKPOINT)
+    highlighter.highlight(source, "c", command.read_lines(source, 90000, 90009), 90000)
+    assert tokens.lines
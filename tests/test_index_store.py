@@ -0,0 +1,17 @@
+import os
+from array import array
+
+import List
+
+
+def test_total_counts_a_replaced_entry_once(tmp_path):
+    store = List.IndexStore(str(tmp_path))
+    fingerprint = (10, 1, b"0" * 16)
+
+    store.save("lines", "/src/a.c", fingerprint, [array('q', range(100))])
+    store.save("lines", "/src/a.c", fingerprint, [array('q', range(200))])
+    store.save("lines", "/src/a.c", fingerprint, [array('q', range(50))])
+    store.save("lines", "/src/b.c", fingerprint, [array('q', range(10))])
+
+    assert store.total == sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert list(store.load("lines", "/src/a.c", fingerprint)[0]) == list(range(50))
@@ -0,0 +1,32 @@
+import gdb
+import List
+
+
+def list_lines(tmp_path, breakpoints=()):
+    path = tmp_path / "t.c"
+    path.write_text("int x;\n\nint main() {\n    int a = 1;\n    // add one\n\n    return a + 1;\n}\n")
+    symtab = gdb.Symtab("t.c", str(path), line_table=[(3, 0x10), (4, 0x18), (7, 0x20), (0, 0x28)])
+    gdb.all_breakpoints.extend(breakpoints)
+    command = List.EnhancedListCommand()
+
+    executable = command.line_tables.get_executable(symtab, 1, 8)
+    output = command.render_window("t.c", "c", command.read_source(str(path)), 1, 8, None, False,
+                                   executable=executable)
+    return executable, output.split("\n")
+
+
+def test_lines_without_code_show_where_a_breakpoint_goes(tmp_path):
+    executable, lines = list_lines(tmp_path)
+
+    assert [i for i in range(1, 9) if i in executable] == [3, 4, 7]
+    assert [executable.placement(i) for i in range(1, 9)] == [3, 3, 3, 4, 7, 7, 7, None]
+    assert lines[0].endswith("(a breakpoint here is placed at line 3)")
+    assert lines[4].endswith("(a breakpoint here is placed at line 7)")
+    assert "placed" not in lines[1] + lines[3] + lines[5] + lines[7]
+
+
+def test_explicit_locations_are_noted_where_they_were_asked_for(tmp_path):
+    breakpoint = gdb.Breakpoint(2, [gdb.BreakpointLocation("t.c", 7)], location="-source t.c -line 5")
+    _, lines = list_lines(tmp_path, [breakpoint])
+
+    assert lines[4].endswith("(breakpoint 2 placed at line 7)")
@@ -0,0 +1,52 @@
+import time
+
+import gdb
+import List
+
+
+def test_sample_stops_leave_the_listing_state_alone():
+    command = List.EnhancedListCommand()
+    profiler = command.profiler
+    command.last_listed = ("main.c", 10, 19)
+    command.render_cache["key"] = "rendered"
+    command.values.values["x"] = "1"
+
+    # The stop of a sample, with the interrupt still pending
+    profiler.pending = True
+    profiler.sample = lambda: None
+    gdb.events.stop.fire(gdb.SignalEvent("SIGINT"))
+
+    assert profiler.resuming
+    assert command.last_listed == ("main.c", 10, 19)
+    assert command.render_cache == {"key": "rendered"}
+    assert command.values.values == {"x": "1"}
+    assert command.prefetcher.stopped is False
+
+
+def test_a_breakpoint_hit_before_the_sample_is_a_user_stop():
+    command = List.EnhancedListCommand()
+    profiler = command.profiler
+    command.last_listed = ("main.c", 10, 19)
+
+    profiler.pending = True
+    gdb.events.stop.fire(gdb.BreakpointEvent([object()]))
+
+    assert not profiler.pending and not profiler.resuming
+    assert command.last_listed is None
+    assert command.prefetcher.stopped is True
+
+
+def test_sampling_resumes_when_turned_on_again():
+    profiler = List.LineProfiler(interval=0.005)
+
+    profiler.enable()
+    time.sleep(0.05)
+    profiler.disable()
+    time.sleep(0.05)
+    gdb.posted.clear()
+
+    profiler.enable()
+    time.sleep(0.1)
+    profiler.disable()
+
+    assert gdb.posted.count(profiler.interrupt) > 1
@@ -0,0 +1,62 @@
+import subprocess
+import sys
+
+import gdb
+import List
+import list_trigrams
+
+
+def make_tree(tmp_path, count):
+    paths = []
+    for number in range(count):
+        path = tmp_path / f"module{number}.c"
+        path.write_text(f"int value_{number};\n\nvoid set_{number}(void) {{\n    value_{number} = {number};\n}}\n")
+        paths.append(str(path))
+    gdb.outputs["info sources"] = "/a.out:\n\n" + ", ".join(paths) + "\n"
+    return paths
+
+
+def test_search_leaves_the_source_cache_alone(tmp_path):
+    paths = make_tree(tmp_path, 4)
+    command = List.EnhancedListCommand()
+    command.source_cache.get(paths[1])
+    command.source_cache.get(paths[0])
+
+    results = list(command.search.search(r"value_[12] =", command.source_cache))
+
+    assert [(path, line_numbers) for path, _, line_numbers in results] == [(paths[1], [4]), (paths[2], [4])]
+    assert results[0][1] is command.source_cache.files[paths[1]]
+    assert list(command.source_cache.files) == [paths[1], paths[0]]
+
+
+def test_listing_the_matches_leaves_the_source_cache_alone(tmp_path):
+    paths = make_tree(tmp_path, 4)
+    command = List.EnhancedListCommand()
+    command.source_cache.get(paths[0])
+
+    gdb.output.clear()
+    command.invoke("/value_[123] =", False)
+
+    assert sum("value_" in text for text in "".join(gdb.output).splitlines()) == 3
+    assert list(command.source_cache.files) == [paths[0]]
+
+
+def test_files_are_indexed_in_worker_processes(tmp_path):
+    paths = make_tree(tmp_path, 20)
+    search = List.SourceSearch(pool_threshold=16)
+
+    assert search.map_index(paths) == [list_trigrams.index_trigrams(path) for path in paths]
+    assert search.pooled == 20
+
+
+def test_workers_run_a_python_that_is_checked(monkeypatch):
+    # Inside gdb sys.executable may name a Python that does not exist
+    monkeypatch.setattr(sys, "executable", "/nonexistent/bin/python")
+    monkeypatch.setattr(sys, "_base_executable", "/nonexistent/bin/python", raising=False)
+    search = List.SourceSearch()
+
+    interpreter = search.get_interpreter()
+
+    assert interpreter is not None and interpreter != "/nonexistent/bin/python"
+    assert subprocess.run([interpreter, "-c", "import sys; print(sys.hexversion)"], capture_output=True,
+                          text=True).stdout.strip() == str(sys.hexversion)
@@ -0,0 +1,46 @@
+import gdb
+import List
+
+
+def make_command(tmp_path):
+    path = tmp_path / "main.c"
+    path.write_text("".join(f"int line_{i};\n" for i in range(1, 41)))
+    symtab = gdb.Symtab("main.c", str(path))
+    gdb.set_frames(gdb.Frame(gdb.Symtab_and_line(symtab, 20)))
+    return List.EnhancedListCommand()
+
+
+def test_stats_option_prints_the_phases_while_stats_are_on(tmp_path):
+    command = make_command(tmp_path)
+    command.stats.enable()
+
+    gdb.output.clear()
+    command.invoke("--stats 10,12", False)
+
+    assert command.stats.enabled
+    assert command.stats.invocations == 1
+    assert gdb.output[-1].endswith("ms: " + command.stats.format_phases(command.stats.slowest[0][3]) + "\n")
+    assert "getscope 1x" in gdb.output[-1]
+
+
+def test_stats_option_times_one_invocation(tmp_path):
+    command = make_command(tmp_path)
+
+    command.invoke("--stats 10,12", False)
+
+    assert not command.stats.enabled
+    assert "getscope 1x" in gdb.output[-1]
+    assert "getscope" not in vars(command)
+
+
+def test_tui_rows_are_not_counted_against_invocations(tmp_path):
+    command = make_command(tmp_path)
+    command.stats.enable()
+    command.invoke("10,12", False)
+
+    window = List.ListWindow(gdb.TuiWindow(), command)
+    window.render()
+
+    phases = command.stats.slowest[0][3]
+    assert command.stats.invocations == 1
+    assert command.stats.counts == {phase: phases.get(phase, (0, 0.0))[0] for phase in List.ListStats.PHASES}
@@ -0,0 +1,36 @@
+import gdb
+import List
+
+
+def make_command():
+    return List.EnhancedListCommand()
+
+
+def test_subscripts_with_side_effects_are_not_extracted():
+    extract = make_command().extract_max_variable_combinations
+
+    assert extract("x = arr[i++] + buf[n--];") == ["x", "arr", "i", "buf", "n"]
+    assert extract("a[f(x)] = b;") == ["a", "x", "b"]
+    assert extract("y = a[i = 0];") == ["y", "a", "i"]
+
+
+def test_plain_subscripts_are_extracted():
+    extract = make_command().extract_max_variable_combinations
+
+    assert extract("total += table[i][2].field + p->next[count];") == ["total", "table[i][2].field",
+                                                                        "p->next[count]"]
+
+
+def test_expressions_with_side_effects_are_never_evaluated(monkeypatch):
+    evaluated = []
+    monkeypatch.setattr(gdb, "parse_and_eval", lambda expression: evaluated.append(expression) or gdb.Value(1))
+    values = make_command().values
+
+    for expression in ("arr[i++]", "buf[n--]", "a[f(x)]", "a[i = 0]", "x += 1", "g()"):
+        try:
+            values.evaluate(expression)
+        except ValueError:
+            pass
+
+    assert evaluated == []
+    assert values.evaluate("a[i] == b") == "1"